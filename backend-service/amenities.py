@@ -0,0 +1,82 @@
+"""
+设施（amenities）规范化
+
+Property.amenities 为 Inside Airbnb 原始 JSON 列表字符串，同一设施有多种写法
+（"Fast wifi – 250 Mbps"、"Wifi"、"AC - split type ductless system"、"Air conditioning" …）。
+normalize() 把每一项映射到规范名：
+  1) 按 CANONICAL 顺序匹配关键词（整词匹配，先匹配更具体的，如 dishwasher 先于 washer）
+  2) 未匹配的取 " - " / ":" 之前的部分，小写并合并空白
+parse() 返回一个房源去重后的规范名集合。查询参数（/properties?amenities=wifi,aircon）使用同一规则，
+recommendation-service/amenities.py 与本文件保持一致，两边的设施编码相同（tests/test_amenities.py 校验）。
+"""
+import json
+import re
+from functools import lru_cache
+
+# 规范名 -> 关键词（整词、不区分大小写），按顺序匹配第一个
+CANONICAL = [
+    ("dishwasher", ("dishwasher",)),
+    ("hair dryer", ("hair dryer", "hairdryer")),
+    ("washer", ("washer", "washing machine")),
+    ("dryer", ("dryer",)),
+    ("wifi", ("wifi", "wi-fi", "wireless internet", "pocket wifi")),
+    ("air conditioning", ("air conditioning", "air-conditioning", "aircon", "air con", "ac", "central air")),
+    ("tv", ("tv", "hdtv", "television")),
+    ("pool table", ("pool table",)),
+    ("pool", ("pool", "swimming pool")),
+    ("gym", ("gym", "exercise equipment", "fitness")),
+    ("kitchen", ("kitchen", "kitchenette")),
+    ("parking", ("parking", "carport", "garage")),
+    ("elevator", ("elevator", "lift")),
+    ("refrigerator", ("refrigerator", "fridge")),
+    ("microwave", ("microwave",)),
+    ("oven", ("oven",)),
+    ("stove", ("stove", "cooktop", "induction")),
+    ("coffee maker", ("coffee maker", "coffee", "espresso", "nespresso")),
+    ("dedicated workspace", ("workspace", "desk")),
+    ("hot tub", ("hot tub", "jacuzzi")),
+    ("bathtub", ("bathtub",)),
+    ("balcony", ("balcony", "patio")),
+    ("self check-in", ("self check-in", "self check in", "keypad", "smart lock", "lockbox")),
+    ("smoke alarm", ("smoke alarm", "smoke detector")),
+    ("carbon monoxide alarm", ("carbon monoxide",)),
+    ("fire extinguisher", ("fire extinguisher",)),
+    ("first aid kit", ("first aid",)),
+    ("iron", ("iron",)),
+]
+
+_QUOTES = str.maketrans({"‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-"})
+_RULES = [(name, re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")\b"))
+          for name, keywords in CANONICAL]
+_DETAIL = re.compile(r"\s+-\s+|:")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=65536)
+def _normalize(text):
+    text = _SPACES.sub(" ", text.translate(_QUOTES).lower()).strip()
+    if not text:
+        return None
+    for canonical, pattern in _RULES:
+        if pattern.search(text):
+            return canonical
+    return _DETAIL.split(text, 1)[0].strip() or None
+
+
+def normalize(name):
+    """单个设施名 -> 规范名（空字符串返回 None）。不同写法的数量有限，结果按原文缓存"""
+    return _normalize(str(name))
+
+
+def parse(text):
+    """amenities 字段（JSON 列表字符串）-> 规范名 frozenset；格式不合法时按逗号切分"""
+    if not text:
+        return frozenset()
+    try:
+        items = json.loads(text)
+        if not isinstance(items, list):
+            items = [items]
+    except (TypeError, ValueError):
+        items = str(text).strip("[]{}").split(",")
+    names = (normalize(str(item).strip().strip('"')) for item in items)
+    return frozenset(n for n in names if n)
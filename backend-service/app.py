@@ -2,6 +2,16 @@ from flask import Flask, jsonify, request
 import requests
 import config
 from models import db, User, UserInteraction, Property
+from migrations import ensure_columns, ensure_indexes, backfill_review_scores
+import geo_index
+import amenities
+import facet_index
+import text_index
+from facet_index import REGION_MAP, ACCOMMODATES_BUCKETS
+from catalog import KeyedCache
+from catalog_cache import PropertyCache
+from view_counter import ViewCounter
+from recommend_client import RecommendClient, run_parallel
 from flask_cors import CORS
 
 app = Flask(__name__)
@@ -9,6 +19,9 @@ CORS(app)
 app.config.from_object(config)
 db.init_app(app)
 
+# 按 id 取房源的读穿透缓存（catalog_cache.py）
+property_cache = PropertyCache(maxsize=config.CATALOG_CACHE_SIZE, ttl=config.CATALOG_CACHE_TTL)
+
 @app.route('/')
 def home():
     return "Flask backend is running!"
@@ -43,7 +56,7 @@ def login():
 @app.route('/search', methods=['POST'])
 def search():
     pid = int(request.json.get('pid', "0"))
-    property_obj = Property.query.filter_by(property_id=pid).first()
+    property_obj = property_cache.get(pid)
     if not property_obj:
         return jsonify({"error": "Property not found"}), 404
     
@@ -62,55 +75,220 @@ def search():
     return jsonify(result)
 
 # ------------------ Property 接口 ------------------
-@app.route('/properties', methods=['GET'])
-def get_properties():
-    regions = request.args.get('regions')      # 例如: "Central,East"
-    types = request.args.get('types')          # 例如: "Entire home,Private room"
-    accommodates = request.args.get('accommodates')  # 例如: "1-2,3-4"
-
-    page = int(request.args.get('page', 1))     # 默认第一页
-    limit = 12  # 默认每页20条
-
+# 每种筛选组合的总数，房源表变化（catalog 版本号）后失效
+property_totals = KeyedCache(ttl=config.CATALOG_CACHE_TTL)
+
+
+def parse_property_filters(args):
+    """
+    解析 regions / types / accommodates / amenities 查询参数，
+    返回规范化（去重、排序）的 (regions, types, accommodates, amenities) 元组，可直接作为缓存键
+    """
+    regions = args.get('regions')      # 例如: "Central,East"
+    types = args.get('types')          # 例如: "Entire home,Private room"
+    accommodates = args.get('accommodates')  # 例如: "1-2,3-4"
+    amenity_names = args.get('amenities')    # 例如: "wifi,washer,aircon"（需同时具备）
+
+    db_regions = tuple(sorted({REGION_MAP[r] for r in regions.split(',') if r in REGION_MAP})) if regions else None
+    type_list = tuple(sorted(set(types.split(',')))) if types else None
+    acc_list = tuple(sorted({a for a in accommodates.split(',') if a in ACCOMMODATES_BUCKETS})) if accommodates else None
+    amenity_list = tuple(sorted({n for n in map(amenities.normalize, amenity_names.split(',')) if n})) \
+        if amenity_names else None
+    return db_regions, type_list, acc_list, amenity_list
+
+
+def filtered_property_query(filters):
+    """区域 / 房型 / 可住人数的 SQL 条件；设施不在 SQL 中筛选，见 amenity_filter()"""
+    db_regions, type_list, acc_list, _ = filters
     query = Property.query
 
-    # ---- Regions 映射 ----
-    region_map = {
-        "Central": "Central Region",
-        "East": "East Region",
-        "North": "North Region",
-        "North-East": "North-East Region",
-        "West": "West Region"
-    }
-
-    if regions:
-        region_list = regions.split(',')
-        db_regions = [region_map.get(r) for r in region_list if region_map.get(r)]
+    if db_regions is not None:
         query = query.filter(Property.neighbourhood_group_cleansed.in_(db_regions))
 
     # ---- Room Type ----
-    if types:
-        type_list = types.split(',')
+    if type_list is not None:
         query = query.filter(Property.room_type.in_(type_list))
 
     # ---- Accommodates ----
-    if accommodates:
-        acc_list = accommodates.split(',')
+    if acc_list:
         acc_filters = []
         for acc in acc_list:
-            if acc == "1-2":
-                acc_filters.append(Property.accommodates <= 2)
-            elif acc == "3-4":
-                acc_filters.append(Property.accommodates.between(3, 4))
-            elif acc == "5-6":
-                acc_filters.append(Property.accommodates.between(5, 6))
-            elif acc == "7 +":
-                acc_filters.append(Property.accommodates >= 7)
-        if acc_filters:
-            query = query.filter(db.or_(*acc_filters))
+            low, high = ACCOMMODATES_BUCKETS[acc]
+            if low is None:
+                acc_filters.append(Property.accommodates <= high)
+            elif high is None:
+                acc_filters.append(Property.accommodates >= low)
+            else:
+                acc_filters.append(Property.accommodates.between(low, high))
+        query = query.filter(db.or_(*acc_filters))
+    return query
+
+
+def amenity_filter(filters):
+    """
+    设施筛选在分面位图上判断：返回 property_id -> bool 的函数，没有设施筛选时返回 None。
+    SQL 路径按索引顺序读取 property_id 后逐个判断，不把匹配的 id 拼成 IN 列表
+    """
+    amenity_list = filters[3]
+    if not amenity_list:
+        return None
+    index = facet_index.get_index()
+    return index.contains(index.match((None, None, None, amenity_list)))
+
+
+def count_properties(query, keep):
+    """query 的匹配数；有设施筛选时只读取 property_id（覆盖索引）逐个判断"""
+    if keep is None:
+        return query.count()
+    ids = query.order_by(None).with_entities(Property.property_id).yield_per(5000)
+    return sum(1 for (pid,) in ids if keep(pid))
+
+
+def fetch_properties(query, keep, limit, offset=0):
+    """
+    按 query 的顺序取一页；有设施筛选时分批读取 property_id 并逐个判断，取满 limit 个即停止，
+    当前页再从房源缓存按主键读取
+    """
+    if keep is None:
+        return query.offset(offset).limit(limit).all()
+    page_ids = []
+    for (pid,) in query.with_entities(Property.property_id).yield_per(500):
+        if not keep(pid):
+            continue
+        if offset > 0:
+            offset -= 1
+            continue
+        page_ids.append(pid)
+        if len(page_ids) >= limit:
+            break
+    return property_cache.get_many(page_ids)
+
+
+# sort 参数 -> (排序列, 是否降序)；均有 (列, property_id) 索引，同值按 property_id 同向排序，整个排序由索引给出
+PROPERTY_SORTS = {
+    'price': (Property.price, False),
+    'rating': (Property.review_scores_rating_num, True),
+}
+
+
+def parse_range_filters(args):
+    """解析 min_price / max_price / min_rating，返回 (min_price, max_price, min_rating)；非数字抛出 ValueError"""
+    def number(name):
+        value = args.get(name)
+        return float(value) if value not in (None, '') else None
+    return number('min_price'), number('max_price'), number('min_rating')
+
+
+def apply_range_filters(query, ranges):
+    min_price, max_price, min_rating = ranges
+    if min_price is not None:
+        query = query.filter(Property.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Property.price <= max_price)
+    if min_rating is not None:
+        query = query.filter(Property.review_scores_rating_num >= min_rating)
+    return query
+
+
+def parse_cursor(after, sort):
+    """
+    解析 after 游标：按 property_id 分页时为 int；sort 时为 (排序值, property_id)，第一页（0 或空）为 None。
+    格式不合法抛出 ValueError
+    """
+    if sort is None:
+        return int(after)
+    if after in ('', '0'):
+        return None
+    value, pid = after.rsplit(',', 1)
+    return float(value), int(pid)
+
+
+def keyset_after(column, descending, cursor):
+    """
+    排序分页游标 (排序值, property_id) 之后的行。
+    前导条件 column >= 值（降序为 <=）是索引上的范围扫描，不使用行值比较，MySQL 也能走索引
+    """
+    value, pid = cursor
+    if descending:
+        return db.and_(column <= value, db.or_(column < value, Property.property_id < pid))
+    return db.and_(column >= value, db.or_(column > value, Property.property_id > pid))
+
+
+@app.route('/properties', methods=['GET'])
+def get_properties():
+    """
+    分页模式：
+      - page=N：偏移分页（默认）
+      - after=<游标>：游标分页，返回游标之后的一页，代价与页码无关；第一页传 after=0，
+        响应中的 next_after 为下一页游标（没有下一页时为 null）。
+        默认按 property_id 升序，游标为 property_id；sort 时游标为 "<排序值>,<property_id>"
+    筛选：regions / types / accommodates / amenities，min_price / max_price / min_rating（数值）
+    排序：sort=price（价格升序）| rating（评分降序），不含价格 / 评分为空的房源
+    """
+    filters = parse_property_filters(request.args)
+    after = request.args.get('after')
+    sort = request.args.get('sort') or None
+    if sort is not None and sort not in PROPERTY_SORTS:
+        return jsonify({"error": f"sort must be one of: {', '.join(PROPERTY_SORTS)}"}), 400
+    try:
+        ranges = parse_range_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "min_price, max_price and min_rating must be numbers"}), 400
+    # 游标只在这里解析一次，各分支共用
+    try:
+        cursor = parse_cursor(after, sort) if after is not None else None
+    except ValueError:
+        return jsonify({"error": "after must be 0 or a next_after value from the previous page"}), 400
+    try:
+        page = int(request.args.get('page', 1))     # 默认第一页
+    except ValueError:
+        return jsonify({"error": "page must be an integer"}), 400
+    limit = 12  # 默认每页20条
+    next_after = None
 
     # ---- 分页查询 ----
-    total = query.count()
-    properties = query.offset((page - 1) * limit).limit(limit).all()
+    if sort is not None:
+        # 排序分页走 (列, property_id) 索引：按索引顺序读取并在 limit 处停止，没有 filesort
+        column, descending = PROPERTY_SORTS[sort]
+        keep = amenity_filter(filters)
+        query = apply_range_filters(filtered_property_query(filters), ranges).filter(column.isnot(None))
+        total = property_totals.get((filters, ranges, sort), lambda: count_properties(query, keep))
+        if descending:
+            query = query.order_by(column.desc(), Property.property_id.desc())
+        else:
+            query = query.order_by(column, Property.property_id)
+        if after is not None:
+            if cursor is not None:
+                query = query.filter(keyset_after(column, descending, cursor))
+            properties = fetch_properties(query, keep, limit)
+            if len(properties) == limit:
+                last = properties[-1]
+                next_after = f"{getattr(last, column.key)!r},{last.property_id}"
+        else:
+            properties = fetch_properties(query, keep, limit, offset=(page - 1) * limit)
+    elif config.FACET_INDEX and ranges == (None, None, None):
+        # 筛选与计数在进程内位图上完成，当前页从房源缓存按主键读取
+        index = facet_index.get_index()
+        matched = index.match(filters)
+        total = matched.bit_count()
+        page_ids = index.page(matched, limit, offset=(page - 1) * limit,
+                              after=cursor)
+        properties = property_cache.get_many(page_ids)
+    else:
+        # 价格 / 评分范围在 ix_property_price / ix_property_rating 上做范围扫描
+        keep = amenity_filter(filters)
+        query = apply_range_filters(filtered_property_query(filters), ranges)
+        total = property_totals.get((filters, ranges), lambda: count_properties(query, keep))
+        if after is not None:
+            properties = fetch_properties(query.filter(Property.property_id > cursor)
+                                          .order_by(Property.property_id), keep, limit)
+        else:
+            # 按主键排序：否则数据库可能按 ix_property_price / ix_property_accommodates 的索引顺序返回，
+            # 偏移分页不稳定，也与游标分页、位图分页的顺序不一致
+            properties = fetch_properties(query.order_by(Property.property_id), keep, limit,
+                                          offset=(page - 1) * limit)
+    if sort is None and after is not None and len(properties) == limit:
+        next_after = properties[-1].property_id
 
     # ---- 数据封装 ----
     result = []
@@ -126,6 +304,61 @@ def get_properties():
             'rating': p.review_scores_rating
         })
 
+    return jsonify({
+        "total": total,
+        "data": result,
+        "next_after": next_after
+    })
+
+
+@app.route('/properties/facets', methods=['GET'])
+def get_property_facets():
+    """
+    当前筛选（regions / types / accommodates / amenities，参数同 /properties）下各分面取值的房源数。
+    统计某一分面时不计该分面自身的选择，例如已选 regions=Central 时仍返回其他区域的数量；
+    设施为 AND 筛选，其数量为当前结果中具备该设施的房源数
+    """
+    filters = parse_property_filters(request.args)
+    index = facet_index.get_index()
+    return jsonify({
+        "total": index.match(filters).bit_count(),
+        "facets": index.facet_counts(filters)
+    })
+
+
+@app.route('/properties/search', methods=['GET'])
+def search_properties():
+    """
+    全文检索（text_index.py）：q 中的词需全部出现在房源名称、描述、周边介绍或设施中，结果按 BM25 相关度排序。
+    regions / types / accommodates / amenities 筛选与 page 分页同 /properties
+    """
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+    filters = parse_property_filters(request.args)
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        return jsonify({"error": "page must be an integer"}), 400
+    limit = 12
+
+    total, hits = text_index.search(q, filters, limit=limit, offset=(page - 1) * limit)
+    scores = dict(hits)
+
+    result = []
+    for p in property_cache.get_many([pid for pid, _ in hits]):
+        result.append({
+            'property_id': p.property_id,
+            'property_name': p.property_name,
+            'image_url': p.picture_url,
+            'region': p.neighbourhood_group_cleansed,
+            'room_type': p.room_type,
+            'accommodates': p.accommodates,
+            'price': p.price,
+            'rating': p.review_scores_rating,
+            'score': round(scores[p.property_id], 4)
+        })
+
     return jsonify({
         "total": total,
         "data": result
@@ -133,6 +366,9 @@ def get_properties():
 
 
 # ------------------ PropertyDetails 接口 ------------------
+view_counter = ViewCounter(app, interval=config.VIEW_FLUSH_INTERVAL, max_pending=config.VIEW_FLUSH_SIZE)
+
+
 @app.route('/properties/<int:property_id>/details', methods=['POST'])
 def property_details(property_id):
     data = request.json
@@ -142,28 +378,16 @@ def property_details(property_id):
         return jsonify({"error": "user_id is required"}), 400
 
     # 查询 property
-    property_obj = Property.query.filter_by(property_id=property_id).first()
+    property_obj = property_cache.get(property_id)
     if not property_obj:
         return jsonify({"error": "Property not found"}), 404
 
     # 查询用户互动
-    if int(user_id) > 0:
-        interaction = UserInteraction.query.filter_by(
-            user_id=user_id,
-            property_id=property_id
-        ).first()
-
-        if interaction:
-            interaction.num_of_views = interaction.num_of_views + 1 if interaction.num_of_views else 1
-        else:
-            interaction = UserInteraction(
-                user_id=user_id,
-                property_id=property_id,
-                user_like=False,
-                num_of_views=1
-            )
-            db.session.add(interaction)
-
+    if int(user_id) > 0 and config.VIEW_WRITE_BEHIND:
+        # 浏览次数先记在内存，由后台线程批量写回，本请求不等待写库
+        view_counter.add(user_id, property_id)
+    elif int(user_id) > 0:
+        UserInteraction.add_views({(int(user_id), property_id): 1})
         db.session.commit()
 
     # 返回 property 信息和用户 like 状态
@@ -206,33 +430,15 @@ def toggle_like(property_id):
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
 
-    # 查找该用户对该房源的交互记录
-    interaction = UserInteraction.query.filter_by(
-        user_id=user_id,
-        property_id=property_id
-    ).first()
-
-    if interaction:
-        # 反转当前点赞状态
-        interaction.user_like = not interaction.user_like
-        action = "like" if interaction.user_like else "unlike"
-    else:
-        # 如果没有记录，创建一个 LIKE=True 的记录
-        interaction = UserInteraction(
-            user_id=user_id,
-            property_id=property_id,
-            user_like=True,
-            num_of_views=0
-        )
-        db.session.add(interaction)
-        action = "like"
-
+    # 单条 upsert 语句反转点赞状态（没有记录时创建 LIKE=True 的记录），并发请求不会产生重复记录
+    user_like = UserInteraction.toggle_like(int(user_id), property_id)
+    action = "like" if user_like else "unlike"
     db.session.commit()
 
     return jsonify({
         "message": "Success",
         "action": action,
-        "user_like": interaction.user_like
+        "user_like": user_like
     })
 
 
@@ -260,7 +466,7 @@ def get_liked_properties():
     property_ids = [record.property_id for record in liked_records]
 
     # 查询对应的房源信息
-    properties = Property.query.filter(Property.property_id.in_(property_ids)).all()
+    properties = property_cache.get_many(property_ids)
 
     result = []
     for p in properties:
@@ -288,9 +494,23 @@ def get_liked_properties():
 #     "distance": <float> # km
 #   } # Optional, get recommendation based on location
 # }
+recommend_client = RecommendClient(
+    config.RECOMMEND_URL,
+    connect_timeout=config.RECOMMEND_CONNECT_TIMEOUT,
+    read_timeout=config.RECOMMEND_READ_TIMEOUT,
+    retries=config.RECOMMEND_RETRIES,
+    pool_size=config.RECOMMEND_POOL_SIZE,
+)
+recommend_metrics = recommend_client.metrics
+
+
 @app.post("/recommend")
 def call_external_recommend():
-    
+    with recommend_metrics.timer("total"):
+        return recommend()
+
+
+def recommend():
     data = request.get_json(force=True)
     user_id = data.get("user_id")
 
@@ -298,31 +518,61 @@ def call_external_recommend():
         return jsonify({"error": "user_id is required"}), 400
 
     queries = []
+    geo = None
+    nearby = None
     location = data.get("location", {})
     if location:
         try:
-            longitude = location["longitude"]
-            latitude = location["latitude"]
-            distance = location["distance"]
-            queries = Property.find_within_radius(latitude,longitude,distance)
-            if not queries:
-                return jsonify({"message": "No interactions found for this user", "recommendations": []}), 401
+            longitude = float(location["longitude"])
+            latitude = float(location["latitude"])
+            distance = float(location["distance"])
         except:
             return jsonify({"error": "location is invalid"}), 400
+        # 与 recommendation-service 的校验一致，超出范围在这里直接返回 400，不再请求推荐服务（NaN 也不满足）
+        if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0 and distance >= 0):
+            return jsonify({"error": "location is invalid"}), 400
+        if config.RECOMMEND_GEO_FILTER == 'service':
+            # recommendation-service 用内存网格索引筛选半径内房源，省去一次数据库查询和大 id 列表
+            geo = {"lat": latitude, "lon": longitude, "radius_km": distance}
+        else:
+            def nearby():
+                with recommend_metrics.timer("geo"):
+                    if config.GEO_INDEX_CACHE:
+                        return geo_index.find_within_radius(latitude,longitude,distance)
+                    return Property.find_within_radius(latitude,longitude,distance)
+
+    def load_interactions():
+        with recommend_metrics.timer("interactions"):
+            return [(i.property_id, i.user_like, i.num_of_views)
+                    for i in UserInteraction.query.filter_by(user_id=user_id).all()]
+
+    # 半径查询与交互查询互不依赖，并发执行（各自独立的数据库连接）
+    if nearby is not None and config.RECOMMEND_CONCURRENT:
+        interactions, queries = run_parallel(app, load_interactions, nearby)
+    else:
+        queries = nearby() if nearby is not None else []
+        interactions = None
+    if nearby is not None and not queries:
+        return jsonify({"message": "No interactions found for this user", "recommendations": []}), 401
+
+    if interactions is None:
+        interactions = load_interactions()
 
-    interactions = UserInteraction.query.filter_by(user_id=user_id).all()
-    if not interactions:
+    # 合并尚未写回数据库的浏览次数
+    pending_views = view_counter.pending_for_user(user_id)
+    if not interactions and not pending_views:
         return jsonify({"message": "No interactions found for this user", "recommendations": []}), 402
 
     inter_list = []
-    for i in interactions:
+    for property_id, user_like, num_of_views in interactions:
         inter_list.append({
-            "listing_id": str(i.property_id),
-            "like": int(i.user_like),   # True->1, False->0
-            "views": int(i.num_of_views or 0)
+            "listing_id": str(property_id),
+            "like": int(user_like),   # True->1, False->0
+            "views": int(num_of_views or 0) + pending_views.pop(property_id, 0)
         })
+    for property_id, views in pending_views.items():
+        inter_list.append({"listing_id": str(property_id), "like": 0, "views": views})
 
-    external_url = "http://recommendation:7860/recommend"  # 替换为实际 URL
     payload = {
         "user_id": str(user_id),
         "interactions": inter_list,
@@ -332,14 +582,29 @@ def call_external_recommend():
         "alpha": 2.0,
         "include_seen": False
     }
+    if geo:
+        payload["location"] = geo
 
     try:
-        resp = requests.post(external_url, json=payload,  headers={'Content-Type': 'application/json'})
-        resp.raise_for_status()
-        result = resp.json()
+        result = recommend_client.recommend(payload)
+    except requests.exceptions.Timeout:
+        return jsonify({"error": "Recommendation service timed out"}), 504
+    except requests.exceptions.HTTPError as e:
+        # 推荐服务拒绝了请求参数（4xx），是调用方的请求有误
+        if e.response is not None and 400 <= e.response.status_code < 500:
+            try:
+                message = e.response.json().get("error") or str(e)
+            except ValueError:
+                message = str(e)
+            return jsonify({"error": message}), 400
+        return jsonify({"error": str(e)}), 500
     except requests.exceptions.RequestException as e:
         return jsonify({"error": str(e)}), 500
-    
+
+    # 半径内没有房源：与数据库筛选方式（以及改动前）的响应一致
+    if result.get("location_empty"):
+        return jsonify({"message": "No interactions found for this user", "recommendations": []}), 401
+
     recommend_ids = []
     for item in result.get("recommendations", []):
         try:
@@ -350,9 +615,9 @@ def call_external_recommend():
     if not recommend_ids:
         return jsonify({"error": "No valid recommendations"}), 404
 
-    properties = Property.query.filter(Property.property_id.in_(recommend_ids)).all()
-
-    properties_sorted = sorted(properties, key=lambda x: recommend_ids.index(x.property_id))
+    # get_many 按 recommend_ids 的顺序返回，无需再排序
+    with recommend_metrics.timer("properties"):
+        properties_sorted = property_cache.get_many(recommend_ids)
 
     response_list = []
     for p in properties_sorted:
@@ -371,7 +636,33 @@ def call_external_recommend():
     return jsonify(response_list)
 
 
+@app.get("/metrics/recommend")
+def recommend_metrics_view():
+    """/recommend 各阶段最近的延迟统计：interactions / geo / recommender / properties / total"""
+    return jsonify({
+        "concurrent": config.RECOMMEND_CONCURRENT,
+        "hops": recommend_metrics.snapshot()
+    })
+
+
+@app.get("/metrics/catalog")
+def catalog_metrics_view():
+    """房源缓存与筛选总数缓存的命中率、加载耗时"""
+    return jsonify({
+        "properties": property_cache.stats(),
+        "filter_totals": {"hits": property_totals.hits, "misses": property_totals.misses}
+    })
+
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()  # 初始化数据库表
+        ensure_columns()  # 为已有表补建列（如 review_scores_*_num）
+        backfill_review_scores()  # 由评分文本列填充数值列
+        ensure_indexes()  # 为已有表补建索引
+        if config.FACET_INDEX:
+            facet_index.get_index()  # 预先构建分面索引
+        if config.CATALOG_PRELOAD:
+            property_cache.preload()  # 预先载入房源缓存
+        text_index.get_index()  # 预先构建全文索引
     app.run(host='0.0.0.0', debug=True, port=8000)
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+位置查询基准：全表 Haversine 扫描 vs 包围盒索引过滤 vs 进程内网格索引
+
+在临时 SQLite 数据库中生成新加坡范围内的随机房源，比较三种查询方式的延迟并校验结果一致：
+  python bench_geo.py --sizes 10000,100000,1000000 --radii 1,5 --queries 20
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import func
+
+from models import db, Property
+from geo_index import GeoIndex
+
+# 新加坡大致范围
+LAT_RANGE = (1.22, 1.47)
+LON_RANGE = (103.60, 104.05)
+
+
+def legacy_find_within_radius(target_lat, target_lon, distance_km):
+    """改动前的实现：对每一行计算 Haversine（全表扫描）"""
+    R = 6371
+    lat_rad = func.radians(Property.latitude)
+    lon_rad = func.radians(Property.longitude)
+    target_lat_rad = math.radians(target_lat)
+    target_lon_rad = math.radians(target_lon)
+    dlat = lat_rad - target_lat_rad
+    dlon = lon_rad - target_lon_rad
+    a = func.sin(dlat / 2) * func.sin(dlat / 2) + \
+        func.cos(target_lat_rad) * func.cos(lat_rad) * \
+        func.sin(dlon / 2) * func.sin(dlon / 2)
+    c = 2 * func.atan2(func.sqrt(a), func.sqrt(1 - a))
+    results = Property.query.with_entities(Property.property_id).filter(R * c <= distance_km).all()
+    return [int(r[0]) for r in results]
+
+
+def populate(n, seed=0):
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+    batch = []
+    for i in range(1, n + 1):
+        batch.append({"property_id": i, "latitude": rng.uniform(*LAT_RANGE), "longitude": rng.uniform(*LON_RANGE)})
+        if len(batch) == 50000:
+            db.session.execute(Property.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Property.__table__.insert(), batch)
+    db.session.commit()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(sizes, radii, queries, seed=0):
+    app = Flask(__name__)
+    path = os.path.join(tempfile.mkdtemp(), "bench_geo.db")
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    rng = random.Random(seed)
+    with app.app_context():
+        for n in sizes:
+            populate(n, seed)
+            start = time.perf_counter()
+            rows = Property.query.with_entities(Property.property_id, Property.latitude, Property.longitude).all()
+            index = GeoIndex(rows)
+            build_ms = (time.perf_counter() - start) * 1000
+            print(f"rows={n:,}  grid build={build_ms:.0f}ms")
+            for radius in radii:
+                timings = {"scan": [], "bbox": [], "grid": []}
+                hits, mismatches = [], 0
+                for _ in range(queries):
+                    lat, lon = rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+                    expected, t_scan = timed(legacy_find_within_radius, lat, lon, radius)
+                    got_bbox, t_bbox = timed(Property.find_within_radius, lat, lon, radius)
+                    got_grid, t_grid = timed(index.within, lat, lon, radius)
+                    timings["scan"].append(t_scan)
+                    timings["bbox"].append(t_bbox)
+                    timings["grid"].append(t_grid)
+                    hits.append(len(expected))
+                    mismatches += sorted(expected) != sorted(got_bbox) or sorted(expected) != got_grid
+                summary = "  ".join(f"{name} p50={statistics.median(ms):.2f}ms" for name, ms in timings.items())
+                print(f"  radius={radius}km  hits~{statistics.mean(hits):.0f}  {summary}  mismatches={mismatches}")
+            db.session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark location lookups on a synthetic property table")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated table sizes")
+    parser.add_argument("--radii", default="1,5", help="Comma-separated radii in km")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per size and radius")
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(",") if s], [float(r) for r in args.radii.split(",") if r], args.queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+全文检索基准：倒排索引 + BM25 vs 逐行子串匹配（相当于 LIKE '%…%' 全表扫描）
+
+生成合成房源文本（常用房源词汇 + Zipf 分布的长尾词），测量索引构建耗时和不同查询的延迟，
+并在较小规模上校验命中集合与逐行分词匹配一致：
+  python bench_search.py --sizes 100000,1000000 --queries 50
+"""
+import argparse
+import itertools
+import json
+import random
+import statistics
+import time
+
+from text_index import TextIndex, tokenize
+
+REGIONS = ["Central Region", "East Region", "North Region", "North-East Region", "West Region"]
+ROOM_TYPES = ["Entire home/apt", "Private room", "Shared room", "Hotel room"]
+AMENITIES = [
+    "Wifi", "Kitchen", "Washer", "Dryer", "Air conditioning", "Pool", "Gym", "Elevator", "TV", "Hair dryer",
+    "Iron", "Hot water", "Microwave", "Refrigerator", "Dishes and silverware", "Shampoo", "Essentials",
+    "Dedicated workspace", "Free parking on premises", "Balcony", "Bathtub", "Coffee maker", "Self check-in",
+    "Smoke alarm", "Fire extinguisher", "Long term stays allowed", "Luggage dropoff allowed", "Security cameras",
+]
+COMMON = (
+    "room apartment condo studio cozy spacious modern bright quiet near mrt station walk minutes city view "
+    "pool gym bedroom bathroom kitchen private shared family friendly clean comfortable central location "
+    "shopping mall food hawker centre airport bus stop orchard marina bay sentosa chinatown little india "
+    "bugis clementi jurong tampines woodlands punggol serangoeng bishan toa payoh queen bed single sofa "
+    "balcony garden rooftop river park beach heritage shophouse loft penthouse luxury budget cheap"
+).split()
+FILTERS = [
+    (None, None, None, None),
+    (("Central Region",), None, None, None),
+    (("East Region", "West Region"), ("Private room",), ("1-2", "3-4"), None),
+]
+
+
+def make_rows(n, seed=0, rare_vocab=20000):
+    rng = random.Random(seed)
+    rare = [f"w{i}" for i in range(rare_vocab)]
+    rare_cum_weights = list(itertools.accumulate(1.0 / (i + 1) for i in range(rare_vocab)))
+
+    def words(k):
+        out = rng.choices(COMMON, k=k)
+        out += rng.choices(rare, cum_weights=rare_cum_weights, k=max(k // 3, 1))
+        rng.shuffle(out)
+        return " ".join(out)
+
+    for i in range(1, n + 1):
+        yield (
+            i,
+            words(4),
+            words(rng.randint(15, 30)),
+            words(rng.randint(5, 12)),
+            json.dumps(rng.sample(AMENITIES, rng.randint(5, 12))),
+            rng.choice(REGIONS),
+            rng.choice(ROOM_TYPES),
+            float(rng.randint(1, 10)),
+        )
+
+
+def make_queries(count, seed=1):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(" ".join(rng.sample(COMMON, 2)))
+        elif kind < 0.7:
+            queries.append(f"{rng.choice(COMMON)} w{rng.randint(0, 200)}")
+        else:
+            queries.append(f"{rng.choice(COMMON)} {rng.choice(COMMON)} {rng.choice(AMENITIES).lower()}")
+    return queries
+
+
+def naive_search(texts, query):
+    """逐行子串匹配：每个查询词都出现在文本中（LIKE '%词%' AND ...）"""
+    words = query.lower().split()
+    return sum(1 for text in texts if all(w in text for w in words))
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def run(sizes, queries, naive_limit, verify_limit, seed=0):
+    query_list = make_queries(queries, seed + 1)
+    for n in sizes:
+        rows = list(make_rows(n, seed))
+        start = time.perf_counter()
+        index = TextIndex(rows)
+        build_s = time.perf_counter() - start
+        postings = sum(len(docs) for docs, _ in index.postings.values())
+        print(f"rows={n:,}  build={build_s:.1f}s  terms={len(index.postings):,}  postings={postings:,}")
+
+        for filters in FILTERS:
+            timings, totals = [], []
+            for q in query_list:
+                start = time.perf_counter()
+                total, _ = index.search(q, filters, limit=12)
+                timings.append((time.perf_counter() - start) * 1000)
+                totals.append(total)
+            print(f"  filters={filters}  hits~{statistics.mean(totals):.0f}  "
+                  f"p50={statistics.median(timings):.2f}ms  p95={percentile(timings, 0.95):.2f}ms  "
+                  f"max={max(timings):.2f}ms")
+
+        if n <= verify_limit:
+            docs = [(r[0], set(tokenize(" ".join(t or "" for t in r[1:5]))), r[5]) for r in rows]
+            mismatches = 0
+            for q in query_list[:20]:
+                terms = set(tokenize(q))
+                expected = {pid for pid, tokens, region in docs if terms <= tokens and region == "Central Region"}
+                total, hits = index.search(q, FILTERS[1], limit=len(expected) + 1)
+                mismatches += total != len(expected) or {pid for pid, _ in hits} != expected
+            print(f"  verified 20 queries against a row-by-row scan: mismatches={mismatches}")
+
+        if n <= naive_limit:
+            texts = [" ".join(t or "" for t in r[1:5]).lower() for r in rows]
+            timings = []
+            for q in query_list[:10]:
+                start = time.perf_counter()
+                naive_search(texts, q)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"  substring scan (LIKE '%...%' equivalent): p50={statistics.median(timings):.1f}ms")
+        del rows, index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the in-process BM25 text index on synthetic listings")
+    parser.add_argument("--sizes", default="100000,1000000", help="Comma-separated corpus sizes")
+    parser.add_argument("--queries", type=int, default=50, help="Queries per size and filter")
+    parser.add_argument("--naive-limit", type=int, default=1000000, help="Largest size to run the substring scan on")
+    parser.add_argument("--verify-limit", type=int, default=100000, help="Largest size to verify results on")
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(",") if s], args.queries, args.naive_limit, args.verify_limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+房源目录版本号
+
+任何通过 SQLAlchemy 会话提交的 Property 新增 / 修改 / 删除都会使版本号加一，
+进程内按目录构建的缓存（位置索引等）以版本号判断是否需要重建。
+其他进程或直接写库的修改无法感知，因此缓存另设最长存活时间（config.CATALOG_CACHE_TTL）。
+"""
+import logging
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Property
+
+_lock = threading.Lock()
+_version = 0
+
+
+def catalog_version():
+    return _version
+
+
+def bump():
+    global _version
+    with _lock:
+        _version += 1
+        return _version
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_catalog_change(session, flush_context):
+    if any(isinstance(obj, Property) for objs in (session.new, session.dirty, session.deleted) for obj in objs):
+        session.info["catalog_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session):
+    if session.info.pop("catalog_changed", False):
+        bump()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("catalog_changed", None)
+
+
+class VersionedCache:
+    """
+    按目录版本号缓存一个构建开销较大的值：版本变化或超过 ttl 秒后，下次 get() 调用 builder 重建。
+    重建在锁内进行，并发请求只会触发一次构建。
+    background=True 时只有首次构建是同步的；之后过期由 get() 触发后台线程重建（同一时间最多一个），
+    重建期间 get() 继续返回旧值，建好后整体替换引用。
+    """
+
+    def __init__(self, builder, ttl, background=False):
+        self._builder = builder
+        self._ttl = ttl
+        self._background = background
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self._built_at = 0.0
+        self._rebuilding = False
+
+    def _fresh(self):
+        return self._version == _version and time.monotonic() - self._built_at < self._ttl
+
+    def get(self):
+        if self._value is not None and self._fresh():
+            return self._value
+        if self._background and self._value is not None:
+            with self._lock:
+                if not self._fresh() and not self._rebuilding:
+                    self._start_rebuild()
+                return self._value
+        with self._lock:
+            if self._value is None or not self._fresh():
+                version = _version
+                self._value = self._builder()
+                self._version = version
+                self._built_at = time.monotonic()
+            return self._value
+
+    def _start_rebuild(self):
+        # 调用方持有 self._lock；builder 通常要查询数据库，在触发请求所属应用的 app context 中运行
+        self._rebuilding = True
+        app = current_app._get_current_object() if has_app_context() else None
+        version = _version
+
+        def run():
+            value = None
+            try:
+                if app is not None:
+                    with app.app_context():
+                        value = self._builder()
+                else:
+                    value = self._builder()
+            except Exception:
+                # 保留旧值，下次 get() 再重试
+                logging.getLogger(__name__).exception("Background rebuild of %r failed", self._builder)
+            with self._lock:
+                if value is not None:
+                    self._value = value
+                    self._version = version
+                    self._built_at = time.monotonic()
+                self._rebuilding = False
+
+        threading.Thread(target=run, name="catalog-rebuild", daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._value = None
+
+
+class KeyedCache:
+    """
+    按目录版本号缓存多个键的值（如每种筛选组合的总数）：版本变化或超过 ttl 秒后整体失效。
+    条目数超过 maxsize 时丢弃最早写入的条目。
+    """
+
+    def __init__(self, ttl, maxsize=1024):
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._version = None
+        self._built_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, builder):
+        with self._lock:
+            if self._version != _version or time.monotonic() - self._built_at >= self._ttl:
+                self._entries.clear()
+                self._version = _version
+                self._built_at = time.monotonic()
+            if key in self._entries:
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            version = self._version
+        value = builder()
+        with self._lock:
+            if self._version == version:
+                if len(self._entries) >= self._maxsize:
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = value
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
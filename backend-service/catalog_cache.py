@@ -0,0 +1,129 @@
+"""
+房源目录的进程内读穿透缓存
+
+Property 在两次数据导入之间基本不变，按 id 取房源的接口（/search、房源详情、收藏列表、推荐结果、
+/properties 当前页）先查本缓存，未命中的 id 一次批量查询补齐：
+  - 缓存值为 CachedProperty（namedtuple，字段与 Property 列同名），处理函数可直接按属性读取
+  - 最多保留 CATALOG_CACHE_SIZE 个房源，超出时淘汰最久未使用的
+  - 目录版本号变化（catalog.py，本进程提交的 Property 修改）或超过 CATALOG_CACHE_TTL 后整体失效；
+    重新导入数据后调用 catalog.bump() 即可立即失效
+命中率、加载次数与耗时见 GET /metrics/catalog。
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import catalog
+from models import Property
+
+_COLUMNS = [attr.key for attr in Property.__mapper__.column_attrs]
+
+CachedProperty = namedtuple("CachedProperty", _COLUMNS)
+
+
+class PropertyCache:
+
+    def __init__(self, maxsize=20000, ttl=300, chunk_size=1000):
+        self.maxsize = int(maxsize)
+        self._ttl = ttl
+        self._chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._built_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_ms = 0.0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self):
+        # 调用方持有 self._lock
+        current = catalog.catalog_version()
+        if self._version != current or time.monotonic() - self._built_at >= self._ttl:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = current
+            self._built_at = time.monotonic()
+
+    def _load(self, ids):
+        start = time.perf_counter()
+        columns = [getattr(Property, name) for name in _COLUMNS]
+        rows = []
+        for i in range(0, len(ids), self._chunk_size):
+            chunk = ids[i:i + self._chunk_size]
+            rows.extend(Property.query.with_entities(*columns).filter(Property.property_id.in_(chunk)).all())
+        elapsed = (time.perf_counter() - start) * 1000
+        return [CachedProperty(*row) for row in rows], elapsed
+
+    def _store(self, version, loaded, elapsed):
+        with self._lock:
+            self.loads += 1
+            self.load_ms += elapsed
+            if self._version != version:
+                return
+            for prop in loaded:
+                self._entries[prop.property_id] = prop
+                self._entries.move_to_end(prop.property_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_many(self, ids):
+        """按 ids 的顺序返回存在的房源（不存在的 id 跳过），未命中的一次批量查询"""
+        ids = [int(i) for i in ids]
+        found = {}
+        with self._lock:
+            self._check_version()
+            version = self._version
+            for pid in ids:
+                prop = self._entries.get(pid)
+                if prop is not None:
+                    self._entries.move_to_end(pid)
+                    found[pid] = prop
+            missing = list(dict.fromkeys(pid for pid in ids if pid not in found))
+            self.hits += len(ids) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            loaded, elapsed = self._load(missing)
+            self._store(version, loaded, elapsed)
+            found.update((prop.property_id, prop) for prop in loaded)
+        return [found[pid] for pid in ids if pid in found]
+
+    def get(self, property_id):
+        props = self.get_many([property_id])
+        return props[0] if props else None
+
+    def preload(self):
+        """按 property_id 顺序载入至多 maxsize 个房源，返回载入数量"""
+        with self._lock:
+            self._check_version()
+            version = self._version
+        ids = [int(r[0]) for r in Property.query.with_entities(Property.property_id)
+               .order_by(Property.property_id).limit(self.maxsize).all()]
+        loaded, elapsed = self._load(ids)
+        self._store(version, loaded, elapsed)
+        return len(loaded)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "loads": self.loads,
+                "load_ms_total": round(self.load_ms, 2),
+                "load_ms_avg": round(self.load_ms / self.loads, 2) if self.loads else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
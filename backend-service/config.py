@@ -4,4 +4,40 @@ MYSQL_HOST = 'db'
 MYSQL_DB = 'rental_data'
 
 SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DB}"
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# 位置推荐的候选筛选方式：
+#   'service' —— 把 {lat, lon, radius_km} 直接交给 recommendation-service，由其内存网格索引筛选
+#   'db'      —— 先用 Property.find_within_radius 查询数据库，再把 id 列表发送过去
+RECOMMEND_GEO_FILTER = 'service'
+
+
+# 'db' 模式下的位置查询：True 使用进程内网格索引（geo_index.py，按目录版本缓存），
+# False 直接查询数据库（包围盒索引过滤 + Haversine）
+GEO_INDEX_CACHE = True
+
+# 进程内目录缓存的最长存活秒数（其他进程修改目录时，最多延迟这么久生效）
+CATALOG_CACHE_TTL = 300
+
+# /properties 的筛选、计数与分页使用进程内分面位图索引（facet_index.py，按目录版本缓存）；
+# False 时直接查询数据库
+FACET_INDEX = True
+
+# 房源详情的浏览次数写后缓冲（view_counter.py）：内存累加，每 VIEW_FLUSH_INTERVAL 秒
+# 或缓冲达到 VIEW_FLUSH_SIZE 个 (user_id, property_id) 时批量写回；False 时每次浏览同步写库
+VIEW_WRITE_BEHIND = True
+VIEW_FLUSH_INTERVAL = 5
+VIEW_FLUSH_SIZE = 500
+
+# recommendation-service 调用（recommend_client.py）：keep-alive 连接池、超时（秒）与有限次重试
+RECOMMEND_URL = "http://recommendation:7860/recommend"
+RECOMMEND_CONNECT_TIMEOUT = 2
+RECOMMEND_READ_TIMEOUT = 10
+RECOMMEND_RETRIES = 2
+RECOMMEND_POOL_SIZE = 10
+# 位置推荐（'db' 模式）时，半径查询与交互查询并发执行
+RECOMMEND_CONCURRENT = True
+
+# 按 id 读取房源的进程内缓存（catalog_cache.py）：最多缓存的房源数，以及启动时是否预先载入
+CATALOG_CACHE_SIZE = 20000
+CATALOG_PRELOAD = True
\ No newline at end of file
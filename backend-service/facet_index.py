@@ -0,0 +1,211 @@
+"""
+房源筛选的进程内分面索引
+
+/properties 的筛选条件（区域、房型、可住人数分段、设施）都是低基数分面。
+启动时从 Property 读取这些列（设施按 amenities.py 解析为规范名，每个房源只解析一次），
+为每个分面值建立一个位图（Python int，第 i 位对应按 property_id 升序的第 i 个房源）：
+  - 区域 / 房型 / 可住人数同一分面内多选为 OR，设施多选为 AND（需同时具备），不同分面之间为 AND
+  - 总数即位图的 bit_count()，分页直接在位图上按位取 property_id
+  - 设施筛选只在位图上完成：SQL 路径（价格 / 评分范围、排序）用 contains() 逐行判断，不生成 IN 列表
+之后浏览请求只需按主键取出当前页的 12 行。目录有修改（catalog.py）或超过 CATALOG_CACHE_TTL 后重建。
+"""
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+import amenities
+import config
+from catalog import VersionedCache
+from models import Property
+
+# ---- Regions 映射 ----
+REGION_MAP = {
+    "Central": "Central Region",
+    "East": "East Region",
+    "North": "North Region",
+    "North-East": "North-East Region",
+    "West": "West Region"
+}
+
+# ---- Accommodates 分段：(下限, 上限)，None 表示不限 ----
+ACCOMMODATES_BUCKETS = {
+    "1-2": (None, 2),
+    "3-4": (3, 4),
+    "5-6": (5, 6),
+    "7 +": (7, None),
+}
+
+# 分页跳过 offset 时先按 2^16 位一段整段跳过，再逐级减半，避免逐位遍历
+_SKIP_BLOCK_BITS = 1 << 16
+
+
+def accommodates_bucket(value):
+    """可住人数 -> 分段名（与 SQL 筛选条件一致：<=2、3~4、5~6、>=7），不属于任何分段返回 None"""
+    if value is None:
+        return None
+    for label, (low, high) in ACCOMMODATES_BUCKETS.items():
+        if (low is None or value >= low) and (high is None or value <= high):
+            return label
+    return None
+
+
+class FacetIndex:
+    """rows: [(property_id, neighbourhood_group_cleansed, room_type, accommodates, amenities), ...]"""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: r[0])
+        self.ids = [int(r[0]) for r in rows]
+        self.all = (1 << len(self.ids)) - 1
+        regions, types, accommodates, amenity_docs = {}, {}, {}, {}
+        for i, (_, region, room_type, acc, amenity_text) in enumerate(rows):
+            for name in amenities.parse(amenity_text):
+                amenity_docs.setdefault(name, []).append(i)
+            if region is not None:
+                regions.setdefault(region, []).append(i)
+            if room_type is not None:
+                types.setdefault(room_type, []).append(i)
+            bucket = accommodates_bucket(acc)
+            if bucket is not None:
+                accommodates.setdefault(bucket, []).append(i)
+        self.regions = {k: self._bitmap(v) for k, v in regions.items()}
+        self.types = {k: self._bitmap(v) for k, v in types.items()}
+        self.accommodates = {k: self._bitmap(v) for k, v in accommodates.items()}
+        # 设施倒排索引：规范名 -> 具备该设施的房源位图
+        self.amenities = {k: self._bitmap(v) for k, v in amenity_docs.items()}
+
+    def _bitmap(self, positions):
+        # 先写入字节数组再一次性转成 int，逐位 | 在大整数上是 O(N^2)
+        buf = bytearray((len(self.ids) + 7) // 8)
+        for i in positions:
+            buf[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(buf, "little")
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _union(bitmaps, values):
+        result = 0
+        for value in values:
+            result |= bitmaps.get(value, 0)
+        return result
+
+    def match(self, filters, skip=None):
+        """
+        filters: parse_property_filters() 的结果 (regions, types, accommodates, amenities)；
+        skip 为忽略的分面名（统计该分面各取值数量时使用）。返回匹配房源的位图
+        """
+        db_regions, type_list, acc_list, amenity_list = filters
+        bitmap = self.all
+        if db_regions is not None and skip != "regions":
+            bitmap &= self._union(self.regions, db_regions)
+        if type_list is not None and skip != "types":
+            bitmap &= self._union(self.types, type_list)
+        if acc_list and skip != "accommodates":
+            bitmap &= self._union(self.accommodates, acc_list)
+        if amenity_list:
+            for name in amenity_list:
+                bitmap &= self.amenities.get(name, 0)
+        return bitmap
+
+    @staticmethod
+    def _positions(bitmap):
+        """
+        按升序产生位图中置位的位置。大整数只转换一次字节，再按 64 位字扫描，跳过全 0 的字，
+        字内用 x & -x 取最低位（小整数运算）；直接在大整数上移位 / 取最低位每次都是 O(N/64)
+        """
+        words = array("Q", bitmap.to_bytes((bitmap.bit_length() + 63) // 64 * 8, "little"))
+        if sys.byteorder != "little":
+            words.byteswap()
+        for w, word in enumerate(words):
+            while word:
+                low = word & -word
+                yield (w << 6) + low.bit_length() - 1
+                word ^= low
+
+    def property_ids(self, bitmap):
+        """位图 -> property_id 列表（升序）"""
+        ids = self.ids
+        return [ids[i] for i in self._positions(bitmap)]
+
+    def contains(self, bitmap):
+        """返回判断 property_id 是否在位图中的函数：位图只转换一次字节，每次判断 O(log N)"""
+        buf = bitmap.to_bytes((len(self.ids) + 7) // 8, "little")
+        ids = self.ids
+
+        def test(property_id):
+            i = bisect_left(ids, property_id)
+            return i < len(ids) and ids[i] == property_id and bool(buf[i >> 3] >> (i & 7) & 1)
+        return test
+
+    def page(self, bitmap, limit, offset=0, after=None):
+        """
+        按 property_id 升序取一页：after 不为空时取 property_id > after 的前 limit 个，
+        否则跳过前 offset 个匹配房源
+        """
+        position = 0
+        if after is not None:
+            position = bisect_right(self.ids, after)
+            bitmap >>= position
+        else:
+            block = _SKIP_BLOCK_BITS
+            while offset > 0 and bitmap and block >= 64:
+                count = (bitmap & ((1 << block) - 1)).bit_count()
+                if count > offset:
+                    block >>= 1
+                    continue
+                offset -= count
+                bitmap >>= block
+                position += block
+
+        ids = []
+        if limit <= 0:
+            return ids
+        for i in self._positions(bitmap):
+            if offset > 0:
+                offset -= 1
+                continue
+            ids.append(self.ids[position + i])
+            if len(ids) >= limit:
+                break
+        return ids
+
+    def facet_counts(self, filters):
+        """
+        当前筛选下每个分面取值的房源数。统计某一分面时忽略该分面自身的选择，
+        这样已选分面的其他取值仍显示可切换到的数量
+        """
+        region_names = {v: k for k, v in REGION_MAP.items()}
+        counts = {}
+        for name, bitmaps in (("regions", self.regions), ("types", self.types), ("accommodates", self.accommodates)):
+            base = self.match(filters, skip=name)
+            values = {}
+            for value, bitmap in bitmaps.items():
+                if name == "regions":
+                    if value not in region_names:
+                        continue
+                    value = region_names[value]
+                values[value] = (bitmap & base).bit_count()
+            counts[name] = values
+        # 设施为 AND：每个设施的数量 = 当前结果中具备该设施的房源数
+        base = self.match(filters)
+        counts["amenities"] = {name: (bitmap & base).bit_count() for name, bitmap in sorted(self.amenities.items())}
+        return counts
+
+
+def _build():
+    rows = Property.query.with_entities(
+        Property.property_id,
+        Property.neighbourhood_group_cleansed,
+        Property.room_type,
+        Property.accommodates,
+        Property.amenities,
+    ).all()
+    return FacetIndex(rows)
+
+
+_cache = VersionedCache(_build, ttl=config.CATALOG_CACHE_TTL)
+
+
+def get_index():
+    return _cache.get()
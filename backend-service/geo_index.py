@@ -0,0 +1,71 @@
+"""
+进程内房源位置索引
+
+按目录版本号缓存的经纬度网格（默认 0.01°，约 1.1 km 一格）：
+半径查询只遍历覆盖包围盒的网格，再对其中的房源计算精确 Haversine 距离，
+不需要访问数据库。目录有修改（catalog.py）或超过 CATALOG_CACHE_TTL 后自动重建。
+"""
+import math
+from collections import defaultdict
+
+import config
+from catalog import VersionedCache
+from models import EARTH_RADIUS_KM, Property, bounding_box
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """与 Property.find_within_radius 相同的 Haversine 公式（km）"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class GeoIndex:
+    """rows: [(property_id, latitude, longitude), ...]；经纬度为空的房源不进入索引"""
+
+    def __init__(self, rows, cell_deg=0.01):
+        self.cell_deg = cell_deg
+        self.cells = defaultdict(list)
+        self.size = 0
+        for property_id, lat, lon in rows:
+            if lat is None or lon is None:
+                continue
+            self.cells[self._cell(lat, lon)].append((int(property_id), lat, lon))
+            self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def within(self, target_lat, target_lon, distance_km):
+        """半径内的 property_id 列表（按 property_id 升序）"""
+        min_lat, max_lat, min_lon, max_lon = bounding_box(target_lat, target_lon, distance_km)
+        lat_lo, lon_lo = self._cell(min_lat, min_lon)
+        lat_hi, lon_hi = self._cell(max_lat, max_lon)
+        found = []
+        if (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1) > len(self.cells):
+            # 半径很大时网格数超过非空网格数，直接遍历非空网格
+            buckets = (b for (i, j), b in self.cells.items() if lat_lo <= i <= lat_hi and lon_lo <= j <= lon_hi)
+        else:
+            buckets = (self.cells.get((i, j), ()) for i in range(lat_lo, lat_hi + 1) for j in range(lon_lo, lon_hi + 1))
+        for bucket in buckets:
+            for property_id, lat, lon in bucket:
+                if haversine_km(target_lat, target_lon, lat, lon) <= distance_km:
+                    found.append(property_id)
+        found.sort()
+        return found
+
+
+def _build():
+    rows = Property.query.with_entities(Property.property_id, Property.latitude, Property.longitude).all()
+    return GeoIndex(rows)
+
+
+_cache = VersionedCache(_build, ttl=config.CATALOG_CACHE_TTL)
+
+
+def find_within_radius(target_lat, target_lon, distance_km):
+    """与 Property.find_within_radius 结果一致，使用缓存的进程内索引"""
+    return _cache.get().within(target_lat, target_lon, distance_km)
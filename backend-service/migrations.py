@@ -0,0 +1,153 @@
+"""
+数据库结构补丁
+
+数据库由 rental_data.sql 初始化，db.create_all() 只会创建缺失的表，不会给已有表补列和索引。
+以下步骤均可重复执行：
+  - ensure_columns()：补建模型中声明但表中缺失的列，MySQL 上把模型声明为 Double 的单精度 FLOAT 列改为 DOUBLE
+  - backfill_review_scores()：由 review_scores_* 文本列填充 *_num 数值列（重新导入数据后同样需要）
+  - ensure_indexes()：补建缺失的索引；创建唯一索引前先合并已有的重复行，否则建索引会失败
+  python migrations.py
+"""
+import math
+
+from sqlalchemy import bindparam, func, inspect
+from sqlalchemy.sql import sqltypes
+
+from models import db, Property, UserInteraction
+
+REVIEW_SCORE_COLUMNS = [
+    'review_scores_rating', 'review_scores_accuracy', 'review_scores_cleanliness', 'review_scores_checkin',
+    'review_scores_communication', 'review_scores_location', 'review_scores_value',
+]
+
+
+def _is_single_precision(reflected_type):
+    return isinstance(reflected_type, sqltypes.Float) and not isinstance(reflected_type, sqltypes.Double)
+
+
+def ensure_columns():
+    """
+    为已存在的表 ALTER TABLE ADD COLUMN 补建模型中的缺失列（均为可空列）；
+    MySQL 上模型为 Double 而表中为单精度 FLOAT 的列 MODIFY 为 DOUBLE（SQLite 的 REAL 本身是双精度）。
+    改宽的 *_num 列置空，由 backfill_review_scores() 从文本列重新解析出精确值；
+    price 没有文本来源，已截断为单精度的值需重新导入数据才能恢复。
+    返回新建或修改的 "表.列" 列表
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    dialect = db.engine.dialect
+    preparer = dialect.identifier_preparer
+    changed = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {c["name"]: c["type"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            ddl = f"{preparer.format_column(column)} {column.type.compile(dialect=dialect)}"
+            if column.name not in existing:
+                db.session.execute(db.text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"))
+            elif (dialect.name == 'mysql' and isinstance(column.type, sqltypes.Double)
+                  and _is_single_precision(existing[column.name])):
+                db.session.execute(db.text(f"ALTER TABLE {preparer.format_table(table)} MODIFY COLUMN {ddl}"))
+                if column.name.endswith('_num'):
+                    db.session.execute(table.update().values({column: None}))
+            else:
+                continue
+            changed.append(f"{table.name}.{column.name}")
+    db.session.commit()
+    return changed
+
+
+def _to_score(text):
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def backfill_review_scores(batch_size=1000):
+    """
+    填充 *_num 为空而文本列有值的行；在 Python 中解析而不是 SQL CAST，
+    无法解析的文本（空串、"N/A"）保持 NULL，不会在 MySQL 严格模式下报错。返回更新的行数
+    """
+    t = Property.__table__
+    pairs = [(t.c[name], t.c[f"{name}_num"]) for name in REVIEW_SCORE_COLUMNS]
+    rows = db.session.execute(
+        db.select(t.c.property_id, *(text for text, _ in pairs))
+        .where(db.or_(*(db.and_(num.is_(None), text.isnot(None)) for text, num in pairs)))
+    ).all()
+    updates = []
+    for row in rows:
+        values = {f"v_{num.name}": _to_score(text) for (_, num), text in zip(pairs, row[1:])}
+        if any(v is not None for v in values.values()):
+            updates.append({"pid": row[0], **values})
+    # 只覆盖为空的列，已有数值保持不变
+    stmt = t.update().where(t.c.property_id == bindparam("pid")).values({
+        num: func.coalesce(num, bindparam(f"v_{num.name}", type_=db.Float)) for _, num in pairs
+    })
+    for i in range(0, len(updates), batch_size):
+        db.session.execute(stmt, updates[i:i + batch_size])
+    db.session.commit()
+    return len(updates)
+
+
+def merge_duplicate_interactions():
+    """
+    合并 user_interactions 中同一 (user_id, property_id) 的多条记录：
+    保留 user_interaction_id 最小的一条，浏览次数求和，任一条点赞即为点赞。返回删除的行数
+    """
+    t = UserInteraction.__table__
+    groups = db.session.execute(
+        db.select(t.c.user_id, t.c.property_id, func.min(t.c.user_interaction_id),
+                  func.sum(func.coalesce(t.c.num_of_views, 0)),
+                  func.max(func.coalesce(t.c.user_like, False).cast(db.Integer)))
+        .where(t.c.user_id.isnot(None), t.c.property_id.isnot(None))
+        .group_by(t.c.user_id, t.c.property_id)
+        .having(func.count() > 1)
+    ).all()
+    removed = 0
+    for user_id, property_id, keep_id, views, liked in groups:
+        db.session.execute(t.update().where(t.c.user_interaction_id == keep_id)
+                           .values(num_of_views=int(views), user_like=bool(liked)))
+        removed += db.session.execute(
+            t.delete().where(t.c.user_id == user_id, t.c.property_id == property_id,
+                             t.c.user_interaction_id != keep_id)
+        ).rowcount
+    db.session.commit()
+    return removed
+
+
+# 创建这些索引之前需要先执行的数据修复
+_BEFORE_CREATE = {
+    'ux_user_interactions_user_property': merge_duplicate_interactions,
+}
+
+
+def ensure_indexes():
+    """为已存在的表创建模型中声明但数据库中缺失的索引，返回新建的索引名列表"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                if index.name in _BEFORE_CREATE:
+                    _BEFORE_CREATE[index.name]()
+                index.create(bind=db.engine)
+                created.append(index.name)
+    return created
+
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        db.create_all()
+        for name in ensure_columns():
+            print(f"Added or widened column {name}")
+        print(f"Backfilled review scores for {backfill_review_scores()} properties")
+        for name in ensure_indexes():
+            print(f"Created index {name}")
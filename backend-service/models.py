@@ -1,9 +1,24 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import func
+from sqlalchemy.dialects import mysql, sqlite
 import math
 
 db = SQLAlchemy()
 
+EARTH_RADIUS_KM = 6371  # 地球半径 km
+
+
+def bounding_box(target_lat, target_lon, distance_km):
+    """
+    覆盖半径 distance_km 圆的经纬度包围盒 (min_lat, max_lat, min_lon, max_lon)，
+    用于在索引列上先做范围过滤，再只对落在框内的行计算 Haversine
+    """
+    dlat = math.degrees(distance_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(min(abs(target_lat) + dlat, 90)))
+    dlon = 180 if cos_lat < 1e-6 else min(math.degrees(distance_km / (EARTH_RADIUS_KM * cos_lat)), 180)
+    return target_lat - dlat, target_lat + dlat, target_lon - dlon, target_lon + dlon
+
+
 class User(db.Model):
     __tablename__ = 'user'
     user_id = db.Column(db.Integer, primary_key=True)
@@ -15,6 +30,14 @@ class User(db.Model):
 
 class Property(db.Model):
     __tablename__ = 'property'
+    __table_args__ = (
+        # 位置查询的包围盒过滤（latitude 范围扫描 + longitude 过滤）
+        db.Index('ix_property_lat_lon', 'latitude', 'longitude'),
+        # 价格 / 评分范围筛选与排序分页：(值, property_id) 与 ORDER BY 一致，按索引顺序读取，无需 filesort
+        db.Index('ix_property_price', 'price', 'property_id'),
+        db.Index('ix_property_rating', 'review_scores_rating_num', 'property_id'),
+        db.Index('ix_property_accommodates', 'accommodates'),
+    )
     property_id = db.Column(db.Integer, primary_key=True)
     property_name = db.Column(db.Text)
     description = db.Column(db.Text)
@@ -36,7 +59,8 @@ class Property(db.Model):
 
     amenities = db.Column(db.Text)
 
-    price = db.Column(db.Float)
+    # 双精度：price 与评分是排序分页游标的一部分，MySQL 单精度 FLOAT 读回的值与存储值不能精确相等
+    price = db.Column(db.Double)
 
     review_scores_rating = db.Column(db.Text)
     review_scores_accuracy = db.Column(db.Text)
@@ -46,14 +70,25 @@ class Property(db.Model):
     review_scores_location = db.Column(db.Text)
     review_scores_value = db.Column(db.Text)
 
+    # review_scores_* 的数值版本（原列为 Text，保持不变），由 migrations.backfill_review_scores() 填充
+    review_scores_rating_num = db.Column(db.Double)
+    review_scores_accuracy_num = db.Column(db.Double)
+    review_scores_cleanliness_num = db.Column(db.Double)
+    review_scores_checkin_num = db.Column(db.Double)
+    review_scores_communication_num = db.Column(db.Double)
+    review_scores_location_num = db.Column(db.Double)
+    review_scores_value_num = db.Column(db.Double)
+
     interactions = db.relationship('UserInteraction', backref='property', lazy=True)
 
     @classmethod
     def find_within_radius(cls, target_lat, target_lon, distance_km):
         """
-        使用 Haversine 公式在 SQL 层筛选指定半径内的 Property 列表
+        使用 Haversine 公式在 SQL 层筛选指定半径内的 Property 列表。
+        先用 ix_property_lat_lon 索引做包围盒过滤，只对框内的行计算 Haversine，避免全表扫描
         """
-        R = 6371  # 地球半径 km
+        R = EARTH_RADIUS_KM
+        min_lat, max_lat, min_lon, max_lon = bounding_box(target_lat, target_lon, distance_km)
 
         # 将经纬度转换为弧度
         lat_rad = func.radians(cls.latitude)
@@ -72,14 +107,59 @@ class Property(db.Model):
         distance_expr = R * c  # km
 
         results = cls.query.with_entities(cls.property_id)\
+            .filter(cls.latitude.between(min_lat, max_lat))\
+            .filter(cls.longitude.between(min_lon, max_lon))\
             .filter(distance_expr <= distance_km).all()
         return [int(r[0]) for r in results]
 
 class UserInteraction(db.Model):
     __tablename__ = 'user_interactions'
+    __table_args__ = (
+        # 每个用户对每个房源只有一条记录；同时是按 (user_id, property_id) 查找和 upsert 的索引
+        db.Index('ux_user_interactions_user_property', 'user_id', 'property_id', unique=True),
+    )
     user_interaction_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'))
     property_id = db.Column(db.Integer, db.ForeignKey('property.property_id'))
     user_like = db.Column(db.Boolean)
     num_of_views = db.Column(db.Integer)
-    
\ No newline at end of file
+
+    @classmethod
+    def _upsert(cls, rows, updates):
+        """
+        INSERT ... ON DUPLICATE KEY UPDATE（MySQL）/ INSERT ... ON CONFLICT DO UPDATE（SQLite），
+        依赖 ux_user_interactions_user_property 唯一索引，单条语句完成插入或更新，无并发重复行。
+        updates(new) 返回需要更新的列，new 为本次插入值（inserted / excluded）
+        """
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'mysql':
+            stmt = mysql.insert(cls.__table__)
+            stmt = stmt.on_duplicate_key_update(updates(stmt.inserted))
+        elif dialect == 'sqlite':
+            stmt = sqlite.insert(cls.__table__)
+            stmt = stmt.on_conflict_do_update(index_elements=['user_id', 'property_id'], set_=updates(stmt.excluded))
+        else:
+            raise ValueError(f"Upsert is not supported for database dialect {dialect!r}")
+        db.session.execute(stmt, rows)
+
+    @classmethod
+    def add_views(cls, counts):
+        """
+        counts: {(user_id, property_id): 浏览次数}。已有记录 num_of_views 在数据库内累加，
+        没有记录的插入 user_like=False。调用方负责 commit
+        """
+        rows = [{"user_id": uid, "property_id": pid, "user_like": False, "num_of_views": n}
+                for (uid, pid), n in counts.items()]
+        if rows:
+            cls._upsert(rows, lambda new: {
+                "num_of_views": func.coalesce(cls.__table__.c.num_of_views, 0) + new.num_of_views
+            })
+
+    @classmethod
+    def toggle_like(cls, user_id, property_id):
+        """反转点赞状态（没有记录时插入 user_like=True），返回新的点赞状态。调用方负责 commit"""
+        cls._upsert({"user_id": user_id, "property_id": property_id, "user_like": True, "num_of_views": 0},
+                    lambda new: {"user_like": db.not_(func.coalesce(cls.__table__.c.user_like, False))})
+        return bool(db.session.execute(
+            db.select(cls.user_like).filter_by(user_id=user_id, property_id=property_id)
+        ).scalar())
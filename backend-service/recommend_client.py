@@ -0,0 +1,115 @@
+"""
+backend -> recommendation-service 调用层
+
+  - 共享 requests.Session：keep-alive 连接池，推荐请求不再每次新建 TCP 连接
+  - 每次调用设置连接 / 读取超时，推荐服务变慢时 worker 不会被无限期占用
+  - 连接失败和 502/503/504 有限次重试（指数退避）；/recommend 只做计算，重试是安全的。
+    读取超时不重试，避免慢请求成倍占用 worker
+  - 按阶段（hop）记录延迟，GET /metrics/recommend 查看
+另提供共享线程池 run_parallel()，用于并发执行互不依赖的数据库查询。
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HopMetrics:
+    """每个阶段保留最近 window 次耗时（ms），统计调用数、失败数和分位数"""
+
+    def __init__(self, window=1000):
+        self._window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counts = {}
+        self._errors = {}
+
+    def record(self, hop, ms, error=False):
+        with self._lock:
+            self._samples.setdefault(hop, deque(maxlen=self._window)).append(ms)
+            self._counts[hop] = self._counts.get(hop, 0) + 1
+            if error:
+                self._errors[hop] = self._errors.get(hop, 0) + 1
+
+    @contextmanager
+    def timer(self, hop):
+        start = time.perf_counter()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            self.record(hop, (time.perf_counter() - start) * 1000, error)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for hop, samples in self._samples.items():
+                ordered = sorted(samples)
+                result[hop] = {
+                    "count": self._counts[hop],
+                    "errors": self._errors.get(hop, 0),
+                    "p50_ms": round(ordered[len(ordered) // 2], 2),
+                    "p95_ms": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 2),
+                    "max_ms": round(ordered[-1], 2),
+                }
+            return result
+
+
+class RecommendClient:
+
+    def __init__(self, url, connect_timeout=2.0, read_timeout=10.0, retries=2, pool_size=10, metrics=None):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.metrics = metrics or HopMetrics()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=False,  # 读取超时说明推荐服务已在处理，不再重试，直接抛出 ReadTimeout
+            status=retries,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+    def recommend(self, payload):
+        """POST /recommend，返回 JSON；超时或重试后仍失败抛出 requests.exceptions.RequestException"""
+        with self.metrics.timer("recommender"):
+            resp = self.session.post(self.url, json=payload, timeout=self.timeout)
+            resp.raise_for_status()
+            return resp.json()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def run_parallel(app, *calls, max_workers=8):
+    """
+    在共享线程池中并发执行多个无参函数（各自在独立的 app context / 数据库会话中），
+    按顺序返回结果；任一函数抛出异常时重新抛出
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="backend-fanout")
+
+    def in_context(fn):
+        def run():
+            with app.app_context():
+                return fn()
+        return run
+
+    futures = [_executor.submit(in_context(fn)) for fn in calls]
+    return [f.result() for f in futures]
@@ -0,0 +1,210 @@
+"""
+房源全文检索的进程内倒排索引（BM25）
+
+从 Property 读取 property_name、description、neighborhood_overview、amenities，分词后为每个词保存
+倒排表（按 property_id 升序的文档序号 + 词频），查询时：
+  1) 查询词全部出现的房源才算命中（AND），从最短的倒排表开始求交
+  2) 区域 / 房型 / 可住人数 / 设施筛选直接使用共享的分面索引（facet_index.get_index()，文档序号与之一致），
+     与常见词的位图求交后在最短倒排表上先行过滤
+  3) 按 BM25 求和排序（房源名称的词频按 NAME_WEIGHT 倍计）
+工作量与查询词的倒排表长度成正比，而不是对 Text 列做 LIKE '%…%' 全表扫描。
+索引与查询结果按目录版本缓存（catalog.py），目录变化或超过 CATALOG_CACHE_TTL 后在后台线程重建，
+重建期间查询继续使用旧索引，不会阻塞在构建上。
+基准：python bench_search.py --sizes 100000,1000000
+"""
+import heapq
+import itertools
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from operator import itemgetter
+
+import config
+import facet_index
+from catalog import KeyedCache, VersionedCache
+from facet_index import FacetIndex
+from models import Property
+
+_TAG = re.compile(r"<[^>]+>")
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or our the this to we with you your".split()
+)
+
+# 房源名称中的词比描述中的更能代表房源
+NAME_WEIGHT = 3
+
+# BM25 参数
+K1 = 1.2
+B = 0.75
+
+# 出现在至少 1/BITMAP_DF_RATIO 个房源中的常见词另存位图（N/8 字节，不超过其倒排表大小），
+# 查询时与筛选位图先做按位与，缩小需要打分的候选
+BITMAP_DF_RATIO = 32
+
+# 每个查询缓存前 RESULT_CACHE_DEPTH 个结果，同一查询翻页（前 10 页）不再重新打分
+RESULT_CACHE_DEPTH = 120
+
+# 每次构建的序号，查询结果缓存以此区分新旧索引
+_generations = itertools.count(1)
+
+
+def tokenize(text):
+    """小写、去 HTML 标签、按字母数字切分、去停用词，复数词去掉末尾 s（rooms -> room）"""
+    if not text:
+        return []
+    tokens = []
+    for token in _TOKEN.findall(_TAG.sub(" ", text.lower())):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class TextIndex:
+    """
+    rows: [(property_id, property_name, description, neighborhood_overview, amenities,
+            neighbourhood_group_cleansed, room_type, accommodates), ...]
+    facets: 已构建的 FacetIndex 时沿用它的文档序号，rows 只需前 5 列，不在其中的房源不参与检索；
+            为空时由 rows 构建
+    """
+
+    def __init__(self, rows, facets=None):
+        if facets is None:
+            rows = sorted(rows, key=lambda r: r[0])
+            facets = FacetIndex([(r[0], r[5], r[6], r[7], r[4]) for r in rows])
+        else:
+            by_id = {int(r[0]): r for r in rows}
+            rows = [by_id.get(pid, (pid, None, None, None, None)) for pid in facets.ids]
+            del by_id
+        self.facets = facets
+        self.ids = array("q", facets.ids)
+        self.generation = next(_generations)
+
+        tfs = {}  # 词 -> (文档序号 array('I'), 词频 array('H'))
+        lengths = array("I")
+        for i, row in enumerate(rows):
+            counts = Counter(tokenize(row[1]))
+            for token in counts:
+                counts[token] *= NAME_WEIGHT
+            for text in row[2:5]:
+                counts.update(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                posting = tfs.get(token)
+                if posting is None:
+                    posting = tfs[token] = (array("I"), array("H"))
+                posting[0].append(i)
+                posting[1].append(min(tf, 65535))
+
+        # 倒排表直接保存每个 (词, 文档) 的 BM25 词频项 tf * (K1 + 1) / (tf + K1 * (1 - B + B * len / avgdl))，
+        # 查询时只需乘以 idf 求和
+        avgdl = (sum(lengths) / len(lengths)) if lengths else 1.0
+        norms = [K1 * (1 - B + B * n / avgdl) for n in lengths]
+        self.postings = {}  # 词 -> (文档序号 array('I'), 词频项 array('f'))
+        for token, (docs, counts) in tfs.items():
+            impacts = array("f", (tf * (K1 + 1) / (tf + norms[d]) for d, tf in zip(docs, counts)))
+            self.postings[token] = (docs, impacts)
+
+        self.bitmaps = {}  # 常见词 -> 位图（与 FacetIndex 相同的文档序号）
+        size = (len(rows) + 7) // 8
+        for token, (docs, _) in self.postings.items():
+            if len(docs) * BITMAP_DF_RATIO >= len(rows):
+                buf = bytearray(size)
+                for d in docs:
+                    buf[d >> 3] |= 1 << (d & 7)
+                self.bitmaps[token] = int.from_bytes(buf, "little")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _idf(self, df):
+        return math.log(1 + (len(self.ids) - df + 0.5) / (df + 0.5))
+
+    def search(self, query, filters=(None, None, None, None), limit=12, offset=0):
+        """
+        返回 (命中总数, [(property_id, score), ...])，按得分降序，同分按 property_id 升序。
+        filters 为 parse_property_filters() 的结果
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+        lists = []
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                return 0, []
+            lists.append(posting)
+        lists.sort(key=lambda p: len(p[0]))
+
+        # 筛选位图与常见词位图求交，在最短的倒排表上一次性过滤
+        allowed = self.facets.match(filters)
+        for term in terms:
+            if term in self.bitmaps:
+                allowed &= self.bitmaps[term]
+        if not allowed:
+            return 0, []
+        allowed = None if allowed == self.facets.all else allowed.to_bytes((len(self.ids) + 7) // 8, "little")
+
+        # 最短的倒排表给出候选
+        docs, impacts = lists[0]
+        idf = self._idf(len(docs))
+        if allowed is None:
+            scores = {d: idf * w for d, w in zip(docs, impacts)}
+        else:
+            scores = {d: idf * w for d, w in zip(docs, impacts) if allowed[d >> 3] >> (d & 7) & 1}
+
+        # 其余词依次求交：候选少时在倒排表中二分查找，否则顺序扫描倒排表
+        for docs, impacts in lists[1:]:
+            if not scores:
+                break
+            idf = self._idf(len(docs))
+            if len(scores) * math.log2(len(docs) + 1) < len(docs):
+                merged = {}
+                for d, score in scores.items():
+                    j = bisect_left(docs, d)
+                    if j < len(docs) and docs[j] == d:
+                        merged[d] = score + idf * impacts[j]
+            else:
+                get = scores.get
+                merged = {d: s + idf * w for d, w in zip(docs, impacts) if (s := get(d)) is not None}
+            scores = merged
+
+        # 字典按文档序号升序插入，nlargest 对同分保持插入顺序，即同分按 property_id 升序
+        top = heapq.nlargest(offset + limit, scores.items(), key=itemgetter(1))[offset:]
+        return len(scores), [(self.ids[d], score) for d, score in top]
+
+
+def _build():
+    facets = facet_index.get_index()
+    rows = Property.query.with_entities(
+        Property.property_id,
+        Property.property_name,
+        Property.description,
+        Property.neighborhood_overview,
+        Property.amenities,
+    ).yield_per(10000)
+    return TextIndex(rows, facets)
+
+
+_cache = VersionedCache(_build, ttl=config.CATALOG_CACHE_TTL, background=True)
+_results = KeyedCache(ttl=config.CATALOG_CACHE_TTL, maxsize=256)
+
+
+def get_index():
+    return _cache.get()
+
+
+def search(query, filters=(None, None, None, None), limit=12, offset=0):
+    """TextIndex.search，前 RESULT_CACHE_DEPTH 个结果按 (查询词, 筛选) 缓存"""
+    index = get_index()
+    if offset + limit > RESULT_CACHE_DEPTH:
+        return index.search(query, filters, limit=limit, offset=offset)
+    key = (index.generation, tuple(sorted(set(tokenize(query)))), filters)
+    total, top = _results.get(key, lambda: index.search(query, filters, limit=RESULT_CACHE_DEPTH))
+    return total, top[offset:offset + limit]
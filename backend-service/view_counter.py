@@ -0,0 +1,147 @@
+"""
+房源浏览次数的写后缓冲（write-behind）
+
+/properties/<id>/details 每次浏览不再同步写库，只在内存中累加 (user_id, property_id) -> 次数，
+后台线程按以下条件批量写回 user_interactions：
+  - 距上次写回超过 VIEW_FLUSH_INTERVAL 秒
+  - 缓冲中的不同 (user_id, property_id) 数达到 VIEW_FLUSH_SIZE
+  - 进程正常退出（atexit）
+写回为一条批量 upsert（UserInteraction.add_views）：已有记录 num_of_views 在数据库内原子累加，
+没有记录的插入。写回失败时：
+  - 数据错误（IntegrityError / DataError，如 user_id 不存在违反外键）：整批改为逐行写回，
+    只有出错的行退回缓冲，其余行正常写入，一行坏数据不会阻塞之后的写回
+  - 其他错误（数据库不可用等）：整批退回缓冲，下次重试
+每个 (user_id, property_id) 连续失败 max_attempts 次后丢弃并记录日志，缓冲不会无限增长。
+进程被强制杀死时，最多丢失一个写回周期内的浏览次数。
+"""
+import atexit
+import threading
+from collections import Counter
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from models import db, UserInteraction
+
+
+class ViewCounter:
+
+    def __init__(self, app, interval=5.0, max_pending=500, max_attempts=5):
+        self.app = app
+        self.interval = float(interval)
+        self.max_pending = int(max_pending)
+        self.max_attempts = int(max_attempts)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = Counter()
+        self._attempts = Counter()  # (user_id, property_id) -> 连续写回失败次数，仅在 _flush_lock 内访问
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.flushed_views = 0
+        self.failed_flushes = 0
+        self.dropped_views = 0
+
+    def start(self):
+        """启动后台写回线程并注册退出时写回（可重复调用；首次 add() 时自动启动）"""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._run, name="view-counter", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def add(self, user_id, property_id, count=1):
+        """记录一次浏览，只操作内存，不访问数据库"""
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            self._pending[(int(user_id), int(property_id))] += count
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def pending_for_user(self, user_id):
+        """该用户尚未写回的浏览次数 {property_id: 次数}；user_id 不是整数时没有任何记录，返回 {}"""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return {}
+        with self._lock:
+            return {pid: n for (uid, pid), n in self._pending.items() if uid == user_id}
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def flush(self):
+        """把缓冲中的浏览次数写回数据库，返回写回的浏览次数"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, Counter()
+            if not batch:
+                return 0
+            with self.app.app_context():
+                try:
+                    self._write(batch)
+                    written, failed = batch, Counter()
+                except (IntegrityError, DataError):
+                    self.failed_flushes += 1
+                    self.app.logger.warning("Failed to flush %d pending view counts, retrying row by row",
+                                            len(batch), exc_info=True)
+                    written, failed = self._write_rows(batch)
+                except Exception:
+                    self.failed_flushes += 1
+                    self.app.logger.exception("Failed to flush %d pending view counts", len(batch))
+                    written, failed = Counter(), batch
+            for key in written:
+                self._attempts.pop(key, None)
+            self._requeue(failed)
+            views = sum(written.values())
+            self.flushed_views += views
+            return views
+
+    def _write_rows(self, batch):
+        """逐行写回，返回 (写入成功的, 失败的)"""
+        written, failed = Counter(), Counter()
+        for key, count in batch.items():
+            try:
+                self._write({key: count})
+                written[key] = count
+            except Exception:
+                failed[key] = count
+        return written, failed
+
+    def _requeue(self, failed):
+        """失败的行退回缓冲；连续失败达到 max_attempts 次的丢弃"""
+        retry = Counter()
+        for key, count in failed.items():
+            self._attempts[key] += 1
+            if self._attempts[key] < self.max_attempts:
+                retry[key] = count
+                continue
+            del self._attempts[key]
+            self.dropped_views += count
+            self.app.logger.error("Dropping %d views of user %s on property %s after %d failed writes",
+                                  count, key[0], key[1], self.max_attempts)
+        if retry:
+            with self._lock:
+                self._pending.update(retry)
+
+    @staticmethod
+    def _write(batch):
+        try:
+            UserInteraction.add_views(batch)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
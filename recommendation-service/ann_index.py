@@ -0,0 +1,168 @@
+"""
+近似最近邻（ANN）候选生成
+
+随机投影 LSH：对 build_similarity.py 保存的归一化特征（features.npy）随机生成超平面，
+每个房源在每张哈希表中的桶号 = 各超平面投影的符号位。余弦相似度越高的两个房源，
+落入同一个桶的概率越大。
+
+打分时不再扫描全部 N 个房源：
+  1) 每个交互过的房源取其所有哈希表同桶成员，按精确余弦保留最相近的 candidates_per_item 个
+  2) 只对这些候选的并集用特征向量精确重算加权相似度，其余房源分数为 -inf
+
+索引在加载时由特征现场构建（固定随机种子，多个 worker 结果一致），无需额外服务：
+  SIMILARITY_MODE=ann SIMILARITY_FEATURES_PATH=./data/similarity python recommendation.py
+召回率 / 延迟对比：
+  python evaluate.py ann ./data/similarity --tables 4,8,16 --candidates 100,300,1000
+"""
+import math
+
+import numpy as np
+
+from build_similarity import load_features
+
+
+def _sorted_unique(values):
+    """排序去重（小数组上比 np.unique 快）"""
+    values = np.sort(values)
+    if len(values) == 0:
+        return values
+    keep = np.empty(len(values), dtype=bool)
+    keep[0] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+
+class LSHIndex:
+    """
+    n_tables 张哈希表，每张 n_bits 个随机超平面。
+    键 = (表号 << n_bits) | 桶号，所有表的键合并为一个有序数组，
+    一次二分查找即可取出多个房源在所有表中的同桶成员。
+    """
+
+    def __init__(self, features, n_tables=8, n_bits=12, seed=0, block_rows=65536):
+        n, d = features.shape
+        rng = np.random.default_rng(seed)
+        self.n = n
+        self.n_tables = int(n_tables)
+        self.n_bits = int(n_bits)
+        self.planes = rng.standard_normal((self.n_tables, d, self.n_bits)).astype(np.float32)
+        bit_values = 1 << np.arange(self.n_bits, dtype=np.int64)
+
+        keys = np.empty((self.n_tables, n), dtype=np.int64)
+        for start in range(0, n, block_rows):
+            block = np.asarray(features[start:start + block_rows], dtype=np.float32)
+            signs = np.einsum("nd,tdb->tnb", block, self.planes) > 0
+            keys[:, start:start + len(block)] = signs @ bit_values
+        keys += np.arange(self.n_tables, dtype=np.int64)[:, None] << self.n_bits
+        self.keys = keys
+        order = np.argsort(keys.ravel(), kind="stable")
+        self.sorted_keys = keys.ravel()[order]
+        self.members = (order % n).astype(np.int32)
+
+    @property
+    def nbytes(self):
+        return int(self.planes.nbytes + self.keys.nbytes + self.sorted_keys.nbytes + self.members.nbytes)
+
+    def bucket_members(self, positions):
+        """
+        positions 中每个房源在所有哈希表中的同桶房源。
+        返回 (owner, member, collisions)：member 与 positions[owner] 同桶，按 owner 分组、组内去重；
+        collisions 为两者同桶的哈希表数，越多越相似。
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        keys = self.keys[:, positions].ravel()
+        lo = np.searchsorted(self.sorted_keys, keys, side="left")
+        hi = np.searchsorted(self.sorted_keys, keys, side="right")
+        counts = hi - lo
+        gather = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        owners = np.repeat(np.tile(np.arange(len(positions), dtype=np.int64), self.n_tables), counts)
+        pairs = np.sort(owners * self.n + self.members[gather])
+        first = np.ones(len(pairs), dtype=bool)
+        np.not_equal(pairs[1:], pairs[:-1], out=first[1:])
+        starts = np.flatnonzero(first)
+        collisions = np.diff(np.append(starts, len(pairs)))
+        pairs = pairs[starts]
+        return pairs // self.n, pairs % self.n, collisions
+
+
+def auto_bits(n, candidates_per_item, n_tables=8):
+    """使所有表的同桶成员合计约为 2 × candidates_per_item（单表桶大小 ≈ 2c / n_tables）"""
+    bucket = max(2.0 * candidates_per_item / max(n_tables, 1), 1.0)
+    return max(1, int(round(math.log2(max(n / bucket, 2)))))
+
+
+class ANNSimilarity:
+    """
+    与 DenseSimilarity / TopKSimilarity 接口一致的近似相似度存储。
+    weighted_scores 只为候选房源打精确分数，非候选房源为 -inf（排序时自然被过滤）。
+    """
+    kind = "ann"
+
+    def __init__(self, ids, features, index, candidates_per_item=300, source=None):
+        if features.shape[0] != len(ids):
+            raise ValueError(f"Feature rows {features.shape[0]} do not match {len(ids)} listing ids")
+        self.ids = [str(i) for i in ids]
+        self.positions = {lid: i for i, lid in enumerate(self.ids)}
+        self.features = np.asarray(features)  # memmap 的 ndarray 视图，避免 memmap 索引开销，仍共享页缓存
+        self.index = index
+        self.candidates_per_item = int(candidates_per_item)
+        self.source = source
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return int(self.features.nbytes + self.index.nbytes)
+
+    def candidates(self, positions):
+        """
+        多个交互房源的候选并集（升序行号）：
+        每个房源取同桶成员中精确余弦最高的 candidates_per_item 个。
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64)
+        owners, members, _ = self.index.bucket_members(positions)
+        c = self.candidates_per_item
+        counts = np.bincount(owners, minlength=len(positions))
+        if counts.max() > c:
+            sims = np.einsum("ij,ij->i", self.features[members], self.features[positions[owners]])
+            order = np.lexsort((-sims, owners))
+            rank = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+            members = members[order[rank < c]]
+        return _sorted_unique(members)
+
+    def _exact(self, positions, weights, columns):
+        sims = self.features[positions] @ self.features[columns].T
+        return np.dot(np.asarray(weights, dtype=np.float64), sims)
+
+    def weighted_scores(self, positions, weights, columns=None):
+        """
+        加权相似度之和。columns 不为空时候选已由调用方给出，直接精确打分；
+        否则由 LSH 生成候选，返回长度为 N 的向量（非候选为 -inf）。
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if columns is not None:
+            return self._exact(positions, weights, columns)
+        candidates = self.candidates(positions)
+        scores = np.full(len(self.ids), -np.inf)
+        scores[candidates] = self._exact(positions, weights, candidates)
+        return scores
+
+    def batch_scores(self, weights):
+        """批量打分：逐用户生成候选并精确打分，返回 (用户数 × N) 稠密分数"""
+        scores = np.full(weights.shape, -np.inf)
+        for row in range(weights.shape[0]):
+            lo, hi = weights.indptr[row], weights.indptr[row + 1]
+            if hi > lo:
+                scores[row] = self.weighted_scores(weights.indices[lo:hi], weights.data[lo:hi])
+        return scores
+
+
+def open_ann(directory, n_tables=8, n_bits=0, candidates_per_item=300, seed=0):
+    """从 build_similarity.py 的输出目录加载特征并构建 LSH 索引；n_bits=0 时按房源数自动选择"""
+    ids, features, _ = load_features(directory)
+    n_bits = n_bits or auto_bits(len(ids), candidates_per_item, n_tables)
+    index = LSHIndex(features, n_tables=n_tables, n_bits=n_bits, seed=seed)
+    return ANNSimilarity(ids, features, index, candidates_per_item=candidates_per_item, source=directory)
@@ -0,0 +1,505 @@
+"""
+离线相似度构建流水线（替代 Consine_Similarity_Calculation.ipynb）
+
+  python build_similarity.py build ./data/listings.csv ./data/similarity --workers 8
+  python build_similarity.py build ./data/listings.csv ./data/similarity_topk --format topk --k 200
+  python build_similarity.py update ./data/listings.csv ./data/similarity
+  python build_similarity.py build ./data/listings.csv ./data/similarity --amenities
+
+步骤：
+  1) 特征化：与 notebook 相同的缺失值处理、one-hot 与 Min-Max 缩放；
+     --amenities 时另加设施多热特征（amenities.py 规范化，与 backend 的设施筛选编码一致）
+  2) L2 归一化：余弦相似度即为归一化向量的内积
+  3) 按行块计算 X[block] @ X.T，进程池并行；每块直接写入磁盘上的 memmap（dense）
+     或只保留每行 Top-K（topk），内存占用与块大小成正比而不是 N²
+输出目录与 similarity_store.py 的二进制格式一致，另外保存 features.npy / features.json
+（归一化特征与特征化参数），供增量更新使用。
+
+增量更新（update）：用已保存的特征化参数编码新的 listings.csv，只重新计算新增/变更房源的
+行与列（O(变更数 × N)），删除已下架房源；房源数量不变时原地修改矩阵。
+特征化参数（Min-Max 范围、类别词表）沿用上次全量构建，需定期全量 build 重新拟合。
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import amenities
+from similarity_store import (
+    MATRIX_FILE, SCALES_FILE, IDS_FILE, SUPPORTED_DTYPES, TopKSimilarity,
+    load_binary, quantize, read_meta, save_topk, top_k_positions, write_ids, write_meta,
+)
+
+FEATURES_FILE = "features.npy"
+FEATURES_META = "features.json"
+
+NUMERIC_FEATURES = [
+    'latitude', 'longitude', 'accommodates', 'bathrooms', 'bedrooms', 'beds',
+    'price', 'number_of_reviews',
+    'review_scores_rating', 'review_scores_accuracy', 'review_scores_cleanliness',
+    'review_scores_checkin', 'review_scores_communication',
+    'review_scores_location', 'review_scores_value'
+]
+REVIEW_FEATURES = [
+    'review_scores_value', 'review_scores_communication', 'review_scores_checkin',
+    'review_scores_accuracy', 'review_scores_cleanliness', 'review_scores_location',
+    'review_scores_rating'
+]
+CATEGORICAL_FEATURES = ['neighbourhood_cleansed', 'neighbourhood_group_cleansed', 'room_type', 'property_type']
+RARE_PROPERTY_TYPE_THRESHOLD = 50
+# 设施特征只保留至少出现在 AMENITY_MIN_COUNT 个房源中的设施
+AMENITY_MIN_COUNT = 20
+
+
+# -----------------------------
+# 1) 特征化
+# -----------------------------
+class Featurizer:
+    """
+    fit() 记录填充值、类别词表与 Min-Max 范围；transform() 按这些参数把房源转换为特征矩阵，
+    因此之后新增的房源可以在同一特征空间中编码（未见过的类别全部为 0）。
+    """
+
+    def __init__(self, params=None):
+        self.params = params
+
+    def fit(self, raw, use_amenities=False, amenity_weight=1.0, amenity_min_count=AMENITY_MIN_COUNT):
+        """
+        use_amenities: 加入设施多热特征；每个房源的设施向量缩放为 L2 范数 amenity_weight，
+        设施数量多的房源不会因此压过其他特征
+        """
+        data = self._clean(raw, fill=None)
+        fill = {col: float(data[col].mean()) for col in REVIEW_FEATURES}
+        fill["price"] = float(data["price"].median())
+        data = self._clean(raw, fill=fill)
+
+        counts = data["property_type"].value_counts()
+        common_types = sorted(counts[counts >= RARE_PROPERTY_TYPE_THRESHOLD].index.astype(str))
+        data["property_type"] = data["property_type"].where(data["property_type"].isin(common_types), "Other")
+
+        self.params = {
+            "fill": fill,
+            "common_property_types": common_types,
+            "categories": {col: sorted(data[col].dropna().astype(str).unique().tolist()) for col in CATEGORICAL_FEATURES},
+            "min": {col: float(data[col].min()) for col in NUMERIC_FEATURES},
+            "max": {col: float(data[col].max()) for col in NUMERIC_FEATURES},
+        }
+        if use_amenities:
+            counts = {}
+            for text in raw["amenities"]:
+                for name in amenities.parse(text if isinstance(text, str) else None):
+                    counts[name] = counts.get(name, 0) + 1
+            self.params["amenities"] = sorted(name for name, c in counts.items() if c >= amenity_min_count)
+            self.params["amenity_weight"] = float(amenity_weight)
+        return self
+
+    @staticmethod
+    def _clean(raw, fill):
+        data = raw[NUMERIC_FEATURES + CATEGORICAL_FEATURES].copy()
+        data["price"] = pd.to_numeric(data["price"].astype(str).str.replace(r"[\$,]", "", regex=True), errors="coerce")
+        for col in NUMERIC_FEATURES:
+            data[col] = pd.to_numeric(data[col], errors="coerce")
+        if fill is not None:
+            for col, value in fill.items():
+                data[col] = data[col].fillna(value)
+        half = np.ceil(data["accommodates"] / 2)
+        data["beds"] = data["beds"].fillna(data["accommodates"])
+        data["bedrooms"] = data["bedrooms"].fillna(half)
+        data["bathrooms"] = data["bathrooms"].fillna(half)
+        return data
+
+    @property
+    def columns(self):
+        cats = [f"{col}_{v}" for col in CATEGORICAL_FEATURES for v in self.params["categories"][col]]
+        return NUMERIC_FEATURES + cats + [f"amenity_{v}" for v in self.params.get("amenities", [])]
+
+    def transform(self, raw):
+        """返回 (N × D) float32 特征矩阵（未归一化）"""
+        p = self.params
+        data = self._clean(raw, fill=p["fill"])
+        data["property_type"] = data["property_type"].where(
+            data["property_type"].astype(str).isin(p["common_property_types"]), "Other")
+
+        blocks = []
+        for col in NUMERIC_FEATURES:
+            lo, hi = p["min"][col], p["max"][col]
+            scale = hi - lo if hi > lo else 1.0
+            blocks.append(((data[col].fillna(lo).to_numpy(dtype=np.float64) - lo) / scale)[:, None])
+        for col in CATEGORICAL_FEATURES:
+            values = data[col].astype(str).to_numpy()
+            vocab = p["categories"][col]
+            blocks.append((values[:, None] == np.asarray(vocab, dtype=object)[None, :]).astype(np.float64))
+        if p.get("amenities"):
+            texts = [t if isinstance(t, str) else None for t in raw["amenities"]]
+            hot = amenities.encode(texts, p["amenities"]).astype(np.float64)
+            norms = np.linalg.norm(hot, axis=1, keepdims=True)
+            blocks.append(hot / np.maximum(norms, 1e-12) * p["amenity_weight"])
+        return np.hstack(blocks).astype(np.float32)
+
+
+def l2_normalize(X):
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.maximum(norms, 1e-12)
+
+
+def _replace_with(path, write):
+    """write(临时文件路径) 写好后原子替换 path：正在 mmap 旧文件的服务进程继续读旧内容，不会读到写了一半的文件"""
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _save_npy(array):
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+    return write
+
+
+def save_features(out_dir, ids, features, featurizer):
+    def write_meta_json(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": list(ids), "columns": featurizer.columns, "params": featurizer.params}, f)
+
+    _replace_with(os.path.join(out_dir, FEATURES_FILE), _save_npy(features))
+    _replace_with(os.path.join(out_dir, FEATURES_META), write_meta_json)
+
+
+def load_features(directory):
+    """返回 (ids, 归一化特征 memmap, Featurizer)"""
+    with open(os.path.join(directory, FEATURES_META), encoding="utf-8") as f:
+        meta = json.load(f)
+    features = np.load(os.path.join(directory, FEATURES_FILE), mmap_mode="r")
+    return meta["ids"], features, Featurizer(meta["params"])
+
+
+def read_listings(path):
+    raw = pd.read_csv(path, encoding="latin1")
+    raw = raw.drop_duplicates(subset=["id"], keep="first").reset_index(drop=True)
+    return raw, raw["id"].astype(str).tolist()
+
+
+# -----------------------------
+# 2) 分块计算（进程池）
+# -----------------------------
+_worker = {}
+
+
+def _init_worker(features_path, output_path, dtype, k):
+    _worker["X"] = np.load(features_path, mmap_mode="r")
+    _worker["out"] = np.load(output_path, mmap_mode="r+") if output_path else None
+    _worker["dtype"] = dtype
+    _worker["k"] = k
+
+
+def _compute_block(start, stop):
+    """
+    计算 [start, stop) 行与所有行的余弦相似度：dense 直接写入 memmap（int8 时返回每行缩放系数），
+    topk 返回每行 Top-K
+    """
+    X = _worker["X"]
+    block = np.asarray(X[start:stop]) @ np.asarray(X).T
+    if _worker["out"] is not None:
+        values, scales = quantize(block, _worker["dtype"])
+        _worker["out"][start:stop] = values
+        _worker["out"].flush()
+        return start, stop, None, scales
+    k = _worker["k"]
+    indices = np.empty((stop - start, k), dtype=np.int32)
+    data = np.empty((stop - start, k), dtype=np.float32)
+    for i, row in enumerate(block):
+        top = top_k_positions(row, k)
+        indices[i], data[i] = top, row[top]
+    return start, stop, indices, data
+
+
+class Progress:
+    """按已完成行数输出进度与吞吐（rows/s）"""
+
+    def __init__(self, total, stream=sys.stderr):
+        self.total = total
+        self.done = 0
+        self.start = time.perf_counter()
+        self.stream = stream
+
+    def update(self, rows):
+        self.done += rows
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+        print(f"\r{self.done}/{self.total} rows  {rate:,.0f} rows/s  elapsed {elapsed:.1f}s  eta {eta:.1f}s",
+              end="", file=self.stream, flush=True)
+
+    def finish(self):
+        print(file=self.stream)
+        elapsed = time.perf_counter() - self.start
+        return {"rows": self.done, "seconds": elapsed, "rows_per_second": self.done / elapsed if elapsed > 0 else 0.0}
+
+
+def row_blocks(n, block_rows):
+    return [(s, min(s + block_rows, n)) for s in range(0, n, block_rows)]
+
+
+def compute_blocks(features_path, row_ranges, progress, output_path=None, dtype="float32", k=None, workers=None):
+    """
+    并行计算 row_ranges 中的 (start, stop) 行块。
+    dense 模式结果写入 output_path；topk 模式按块 yield (start, stop, indices, data)。
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(features_path, output_path, dtype, k)) as pool:
+        futures = [pool.submit(_compute_block, start, stop) for start, stop in row_ranges]
+        for future in as_completed(futures):
+            start, stop, indices, data = future.result()
+            progress.update(stop - start)
+            yield start, stop, indices, data
+
+
+# -----------------------------
+# 3) 构建
+# -----------------------------
+def build(listings_path, out_dir, fmt="dense", dtype="float32", k=200, block_rows=512, workers=None,
+          use_amenities=False, amenity_weight=1.0):
+    os.makedirs(out_dir, exist_ok=True)
+    raw, ids = read_listings(listings_path)
+    featurizer = Featurizer().fit(raw, use_amenities=use_amenities, amenity_weight=amenity_weight)
+    features = l2_normalize(featurizer.transform(raw)).astype(np.float32)
+    save_features(out_dir, ids, features, featurizer)
+    features_path = os.path.join(out_dir, FEATURES_FILE)
+    n = len(ids)
+    ranges = row_blocks(n, block_rows)
+    progress = Progress(n)
+
+    if fmt == "dense":
+        matrix_tmp = os.path.join(out_dir, MATRIX_FILE + ".tmp")
+        np.lib.format.open_memmap(matrix_tmp, mode="w+", dtype=dtype, shape=(n, n)).flush()
+        scales = np.ones(n, dtype=np.float32)
+        for start, stop, _, block_scales in compute_blocks(
+                features_path, ranges, progress, output_path=matrix_tmp, dtype=dtype, workers=workers):
+            if block_scales is not None:
+                scales[start:stop] = block_scales
+        os.replace(matrix_tmp, os.path.join(out_dir, MATRIX_FILE))
+        if dtype == "int8":
+            _replace_with(os.path.join(out_dir, SCALES_FILE), _save_npy(scales))
+        _replace_with(os.path.join(out_dir, IDS_FILE), lambda tmp: write_ids(tmp, ids))
+        write_meta(out_dir, {
+            "format": "dense",
+            "dtype": dtype,
+            "shape": [n, n],
+            "source": os.path.abspath(listings_path),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+    else:
+        k = min(int(k), n)
+        indices = np.empty((n, k), dtype=np.int32)
+        data = np.empty((n, k), dtype=np.float32)
+        for start, stop, block_indices, block_data in compute_blocks(
+                features_path, ranges, progress, k=k, workers=workers):
+            indices[start:stop], data[start:stop] = block_indices, block_data
+        indptr = np.arange(0, n * k + 1, k, dtype=np.int64)
+        save_topk(TopKSimilarity(ids, indptr, indices.ravel(), data.ravel(), k, source=listings_path), out_dir)
+    return progress.finish()
+
+
+# -----------------------------
+# 4) 增量更新
+# -----------------------------
+def diff_listings(old_ids, old_features, new_ids, new_features, atol=1e-6):
+    """
+    对比新旧房源，返回 (新顺序 ids, 新顺序特征, 旧行号 -> 新行号映射（已删除为 -1）, 需要重算的新行号, 计数)。
+    新顺序 = 保留的旧房源（保持原顺序）+ 新增房源，便于直接复用旧矩阵的子块。
+    """
+    new_pos = {lid: i for i, lid in enumerate(new_ids)}
+    old_set = set(old_ids)
+    kept = [lid for lid in old_ids if lid in new_pos]
+    added = [lid for lid in new_ids if lid not in old_set]
+    order = kept + added
+    features = new_features[[new_pos[lid] for lid in order]]
+
+    old_pos = {lid: i for i, lid in enumerate(old_ids)}
+    kept_old = np.fromiter((old_pos[lid] for lid in kept), dtype=np.int64, count=len(kept))
+    changed = np.flatnonzero(np.any(np.abs(np.asarray(old_features)[kept_old] - features[:len(kept)]) > atol, axis=1))
+
+    old_to_new = np.full(len(old_ids), -1, dtype=np.int64)
+    old_to_new[kept_old] = np.arange(len(kept))
+    dirty = np.concatenate([changed, np.arange(len(kept), len(order))]).astype(np.int64)
+    return order, features, old_to_new, dirty, {
+        "added": len(added), "changed": int(len(changed)), "removed": len(old_ids) - len(kept),
+    }
+
+
+def _update_dense(directory, old, order, features, old_to_new, dirty, block_rows, progress, source):
+    n = len(order)
+    dtype = str(old.matrix.dtype)
+    path = os.path.join(directory, MATRIX_FILE)
+    # 始终在 matrix.npy.tmp 上修改再原子替换：服务进程 mmap 着 matrix.npy，原地修改会让进行中的请求
+    # 读到改了一半的行，且与尚未更新的 listing_ids.txt 对不上
+    tmp = path + ".tmp"
+    if n == len(old) and np.array_equal(old_to_new, np.arange(n)):
+        # 房源集合不变：复制旧矩阵，只改变更行/列
+        shutil.copyfile(path, tmp)
+        matrix = np.load(tmp, mmap_mode="r+")
+    else:
+        # 房源增删：新矩阵先复制保留部分（只复制不重算），再补算变更行/列
+        matrix = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(n, n))
+        kept_old = np.flatnonzero(old_to_new >= 0)
+        kept_new = old_to_new[kept_old]
+        for start in range(0, len(kept_old), block_rows):
+            rows = kept_old[start:start + block_rows]
+            matrix[kept_new[start:start + block_rows], :len(kept_new)] = np.asarray(old.matrix[rows])[:, kept_old]
+    for start in range(0, len(dirty), block_rows):
+        rows = dirty[start:start + block_rows]
+        block = (features[rows] @ features.T).astype(dtype)
+        matrix[rows] = block
+        matrix[:, rows] = block.T
+        progress.update(len(rows))
+    matrix.flush()
+    del matrix
+    os.replace(tmp, path)
+    _replace_with(os.path.join(directory, IDS_FILE), lambda ids_tmp: write_ids(ids_tmp, order))
+    meta = read_meta(directory)
+    meta.update({"shape": [n, n], "source": os.path.abspath(source),
+                 "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+    write_meta(directory, meta)
+
+
+def _update_topk(directory, old, order, features, old_to_new, dirty, block_rows, progress, source):
+    n = len(order)
+    k = min(old.k, n)
+    is_dirty = np.zeros(n, dtype=bool)
+    is_dirty[dirty] = True
+
+    # 变更房源与所有房源的相似度（|变更| × N），既是变更行的新内容，也是其他行的候选邻居
+    dirty_sims = np.empty((len(dirty), n), dtype=np.float32)
+    for start in range(0, len(dirty), block_rows):
+        rows = dirty[start:start + block_rows]
+        dirty_sims[start:start + len(rows)] = features[rows] @ features.T
+        progress.update(len(rows))
+
+    rows_indices, rows_data = [None] * n, [None] * n
+    for i, row in enumerate(dirty):
+        top = top_k_positions(dirty_sims[i], k)
+        rows_indices[row], rows_data[row] = top.astype(np.int32), dirty_sims[i][top]
+
+    # 未变更的行：旧邻居（去掉已删除/已变更）+ 变更房源合并取 Top-K。
+    # 旧列表之外的房源相似度不超过旧的第 K 名，合并后的第 K 名低于它时结果不可信，整行重算
+    stale = []
+    for old_row in np.flatnonzero(old_to_new >= 0):
+        row = old_to_new[old_row]
+        if is_dirty[row]:
+            continue
+        lo, hi = old.indptr[old_row], old.indptr[old_row + 1]
+        old_data = np.asarray(old.data[lo:hi])
+        if hi - lo >= len(old):
+            threshold = -np.inf
+        elif hi - lo >= old.k:
+            threshold = old_data.min()
+        else:
+            threshold = np.inf
+        neighbours = old_to_new[old.indices[lo:hi]]
+        keep = neighbours >= 0
+        keep[keep] &= ~is_dirty[neighbours[keep]]
+        cand_idx = np.concatenate([neighbours[keep], dirty])
+        cand_sim = np.concatenate([old_data[keep], dirty_sims[:, row]])
+        top = top_k_positions(cand_sim, k)
+        if len(top) < k or cand_sim[top].min() < threshold:
+            stale.append(row)
+            continue
+        rows_indices[row], rows_data[row] = cand_idx[top].astype(np.int32), cand_sim[top].astype(np.float32)
+
+    stale = np.asarray(stale, dtype=np.int64)
+    progress.total += len(stale)
+    for start in range(0, len(stale), block_rows):
+        rows = stale[start:start + block_rows]
+        block = features[rows] @ features.T
+        for row, sims in zip(rows, block):
+            top = top_k_positions(sims, k)
+            rows_indices[row], rows_data[row] = top.astype(np.int32), sims[top].astype(np.float32)
+        progress.update(len(rows))
+
+    counts = np.fromiter((len(r) for r in rows_indices), dtype=np.int64, count=n)
+    indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    topk = TopKSimilarity(order, indptr, np.concatenate(rows_indices), np.concatenate(rows_data), k,
+                          source=source)
+    del old
+    save_topk(topk, directory)
+
+
+def update(listings_path, directory, block_rows=512):
+    """
+    增量更新已有的相似度目录（由 build 生成，包含 features.npy / features.json）。
+    topk 格式中未变更的行：去掉已删除/已变更的旧邻居，与变更房源合并后重新取 Top-K；
+    邻居被删除或变得不相似、无法确定新第 K 名的行整行重算，结果与全量计算一致。
+    """
+    old_ids, old_features, featurizer = load_features(directory)
+    old = load_binary(directory)
+    if old.ids != [str(i) for i in old_ids]:
+        raise ValueError(f"{directory}: features.json ids do not match the similarity index")
+    if old.kind == "dense" and old.scales is not None:
+        raise ValueError(f"{directory}: int8 matrices cannot be patched in place; rebuild, "
+                         f"or update a float32 build and re-quantize it with similarity_store.py quantize")
+
+    raw, new_ids = read_listings(listings_path)
+    new_features = l2_normalize(featurizer.transform(raw)).astype(np.float32)
+    order, features, old_to_new, dirty, stats = diff_listings(old_ids, old_features, new_ids, new_features)
+
+    progress = Progress(len(dirty))
+    if len(dirty) or stats["removed"]:
+        if old.kind == "dense":
+            _update_dense(directory, old, order, features, old_to_new, dirty, block_rows, progress, listings_path)
+        else:
+            _update_topk(directory, old, order, features, old_to_new, dirty, block_rows, progress, listings_path)
+        del old, old_features
+        save_features(directory, order, features, featurizer)
+    report = progress.finish()
+    report.update(stats)
+    report["listings"] = len(order)
+    return report
+
+
+# -----------------------------
+# 5) 命令行
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline similarity build pipeline")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Featurise listings.csv and compute cosine similarities block by block")
+    p_build.add_argument("listings", help="Path to listings.csv")
+    p_build.add_argument("out_dir", help="Output directory, e.g. ./data/similarity")
+    p_build.add_argument("--format", choices=("dense", "topk"), default="dense")
+    p_build.add_argument("--dtype", choices=SUPPORTED_DTYPES, default="float32", help="Dense matrix dtype")
+    p_build.add_argument("--k", type=int, default=200, help="Neighbours kept per listing (topk)")
+    p_build.add_argument("--block-rows", type=int, default=512, help="Rows computed per task")
+    p_build.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    p_build.add_argument("--amenities", action="store_true", help="Add normalised amenity features")
+    p_build.add_argument("--amenity-weight", type=float, default=1.0,
+                         help="L2 norm of each listing's amenity block relative to the other features")
+
+    p_update = sub.add_parser("update", help="Incrementally update a built similarity directory from listings.csv")
+    p_update.add_argument("listings", help="Path to the new listings.csv")
+    p_update.add_argument("directory", help="Directory produced by 'build'")
+    p_update.add_argument("--block-rows", type=int, default=512, help="Changed rows computed per block")
+
+    args = parser.parse_args(argv)
+    if args.command == "update":
+        report = update(args.listings, args.directory, block_rows=args.block_rows)
+        print(f"Updated {args.directory}: {report['added']} added, {report['changed']} changed, "
+              f"{report['removed']} removed, {report['listings']} listings; "
+              f"{report['rows']} rows recomputed in {report['seconds']:.1f}s")
+    elif args.command == "build":
+        report = build(args.listings, args.out_dir, fmt=args.format, dtype=args.dtype, k=args.k,
+                       block_rows=args.block_rows, workers=args.workers,
+                       use_amenities=args.amenities, amenity_weight=args.amenity_weight)
+        print(f"Built {args.format} similarity for {report['rows']} listings in {report['seconds']:.1f}s "
+              f"({report['rows_per_second']:,.0f} rows/s) -> {args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
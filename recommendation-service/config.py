@@ -0,0 +1,39 @@
+import os
+
+# 相似度矩阵
+# 优先使用二进制 memmap 格式（similarity_store.py convert 生成），否则回退到 CSV
+# SIMILARITY_MODE=topk 时使用稀疏 Top-K 邻居索引（similarity_store.py topk 生成），
+# 若索引目录不存在则从稠密矩阵现场构建
+SIMILARITY_MODE = os.environ.get("SIMILARITY_MODE", "dense")
+SIMILARITY_PATH = os.environ.get("SIMILARITY_PATH", "./data/similarity")
+SIMILARITY_CSV = os.environ.get("SIMILARITY_CSV", "./data/cosine_similarity.csv")
+SIMILARITY_TOPK_PATH = os.environ.get("SIMILARITY_TOPK_PATH", "./data/similarity_topk")
+SIMILARITY_TOPK_K = int(os.environ.get("SIMILARITY_TOPK_K", "200"))
+
+# SIMILARITY_MODE=ann 时使用 LSH 近似候选 + 精确重算（ann_index.py），
+# 特征来自 build_similarity.py 输出目录中的 features.npy
+SIMILARITY_FEATURES_PATH = os.environ.get("SIMILARITY_FEATURES_PATH", SIMILARITY_PATH)
+ANN_TABLES = int(os.environ.get("ANN_TABLES", "8"))
+ANN_BITS = int(os.environ.get("ANN_BITS", "0"))  # 0 = 按房源数自动选择
+ANN_CANDIDATES = int(os.environ.get("ANN_CANDIDATES", "300"))  # 每个交互房源的候选数
+
+# 房源表
+LISTINGS_CSV = os.environ.get("LISTINGS_CSV", "./data/listings.csv")
+
+# 批量推荐每次矩阵乘法处理的用户数（分数矩阵内存 ≈ BATCH_CHUNK_SIZE × N × 8 字节）
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", "128"))
+
+# 用户交互快照（.npz）；存在时启动直接恢复，退出或调用 POST /interactions/snapshot 时写入
+INTERACTIONS_SNAPSHOT = os.environ.get("INTERACTIONS_SNAPSHOT", "./data/interactions.npz")
+
+# 推荐结果缓存：最大条目数（0 关闭）与存活秒数
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "4096"))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "300"))
+
+# 模型热加载：每隔多少秒检查数据文件是否更新并自动重新加载（0 关闭，只能通过 POST /admin/reload 触发）
+MODEL_RELOAD_POLL = float(os.environ.get("MODEL_RELOAD_POLL", "0"))
+
+# 生产模式（serve.py）：worker 进程数、每进程线程数、端口
+WORKERS = int(os.environ.get("RECOMMEND_WORKERS", str(os.cpu_count() or 1)))
+THREADS = int(os.environ.get("RECOMMEND_THREADS", "4"))
+PORT = int(os.environ.get("PORT", "7860"))
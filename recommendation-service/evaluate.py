@@ -0,0 +1,296 @@
+"""
+推荐质量 / 延迟对比工具
+
+以稠密矩阵的推荐结果为基准，对比其他相似度存储（如稀疏 Top-K 索引）的
+Top-K 重合率（recall@K）与单次打分延迟：
+  python evaluate.py compare ./data/similarity ./data/similarity_topk --users 500 --k 10
+
+候选集受限打分（listing_id_queries）与全量打分后过滤的延迟对比：
+  python evaluate.py bench-restricted ./data/similarity --sizes 10,100,1000,10000
+
+LSH 近似候选（ann_index.py）在不同哈希表数 / 候选数下的 recall@K 与延迟：
+  python evaluate.py ann ./data/similarity --tables 4,8,16 --candidates 100,300,1000
+
+不同存储精度（float32 / float16 / int8）相对 float64 的 Top-K 重合率、分数误差与内存：
+  python evaluate.py precision ./data/cosine_similarity.csv --dtypes float32,float16,int8
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from ann_index import ANNSimilarity, LSHIndex, auto_bits
+from build_similarity import load_features
+from similarity_store import DenseSimilarity, open_similarity, quantize, top_k_positions
+
+
+# -----------------------------
+# 1) 模拟用户
+# -----------------------------
+def sample_profiles(n_items, n_users=200, max_items=10, alpha=2.0, seed=0):
+    """随机生成用户交互：(listing 行号, 兴趣分数 α * like + views)"""
+    rng = np.random.default_rng(seed)
+    profiles = []
+    for _ in range(n_users):
+        size = int(rng.integers(1, max_items + 1))
+        positions = rng.choice(n_items, size=min(size, n_items), replace=False)
+        like = rng.integers(0, 2, size=len(positions))
+        views = rng.integers(1, 6, size=len(positions))
+        profiles.append((positions, alpha * like + views))
+    return profiles
+
+
+# -----------------------------
+# 2) 指标
+# -----------------------------
+def rank(store, positions, weights, k):
+    """与线上一致：加权打分、排除已交互房源、取 Top-K；返回 (结果行号, 耗时秒)"""
+    start = time.perf_counter()
+    if store.kind == "ann":
+        # 与线上一致：只对 LSH 候选打分、排序
+        columns = store.candidates(positions)
+        scores = store.weighted_scores(positions, weights, columns=columns) / weights.sum()
+        scores[np.isin(columns, positions)] = -np.inf
+        top = columns[top_k_positions(scores, k)]
+    else:
+        scores = store.weighted_scores(positions, weights) / weights.sum()
+        scores[positions] = -np.inf
+        top = top_k_positions(scores, k)
+    return top, time.perf_counter() - start
+
+
+def latency_summary(seconds):
+    ms = np.asarray(seconds) * 1000.0
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def compare(reference, candidate, profiles, k=10):
+    """对同一批用户分别排序，统计 recall@K 与两边的延迟分布"""
+    if reference.ids != candidate.ids:
+        raise ValueError("Reference and candidate stores index different listings")
+    recalls, ref_times, cand_times = [], [], []
+    for positions, weights in profiles:
+        expected, ref_t = rank(reference, positions, weights, k)
+        got, cand_t = rank(candidate, positions, weights, k)
+        recalls.append(len(set(expected.tolist()) & set(got.tolist())) / max(len(expected), 1))
+        ref_times.append(ref_t)
+        cand_times.append(cand_t)
+    recalls = np.asarray(recalls)
+    return {
+        "users": len(profiles),
+        "k": k,
+        f"recall@{k}_mean": float(recalls.mean()),
+        f"recall@{k}_min": float(recalls.min()),
+        "reference": {"kind": reference.kind, "mib": reference.nbytes / 2**20, **latency_summary(ref_times)},
+        "candidate": {"kind": candidate.kind, "mib": candidate.nbytes / 2**20, **latency_summary(cand_times)},
+    }
+
+
+def bench_restricted(store, profiles, sizes, k=10, seed=0):
+    """
+    对不同候选集大小，比较「只收集候选列打分」与「全量打分后按候选过滤」的延迟，
+    并校验两者 Top-K 一致。
+    """
+    rng = np.random.default_rng(seed)
+    n = len(store)
+    rows = []
+    for size in sizes:
+        size = min(int(size), n)
+        restricted_t, full_t, mismatches = [], [], 0
+        for positions, weights in profiles:
+            columns = np.sort(rng.choice(n, size=size, replace=False))
+
+            start = time.perf_counter()
+            sub = store.weighted_scores(positions, weights, columns=columns)
+            sub[np.isin(columns, positions)] = -np.inf
+            restricted = columns[top_k_positions(sub, k)]
+            restricted_t.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            scores = store.weighted_scores(positions, weights)
+            scores[positions] = -np.inf
+            filtered = columns[top_k_positions(scores[columns], k)]
+            full_t.append(time.perf_counter() - start)
+
+            mismatches += set(restricted.tolist()) != set(filtered.tolist())
+        rows.append({
+            "candidates": size,
+            "restricted": latency_summary(restricted_t),
+            "full": latency_summary(full_t),
+            "mismatches": mismatches,
+        })
+    return rows
+
+
+def ann_sweep(reference, features_dir, profiles, tables, candidates, k=10, bits=0, seed=0):
+    """对每组 (哈希表数, 每房源候选数) 构建 LSH 索引，与稠密基准对比 recall@K 与延迟"""
+    ids, features, _ = load_features(features_dir)
+    rows = []
+    for n_tables in tables:
+        for per_item in candidates:
+            n_bits = bits or auto_bits(len(ids), per_item, n_tables)
+            start = time.perf_counter()
+            index = LSHIndex(features, n_tables=n_tables, n_bits=n_bits, seed=seed)
+            build_seconds = time.perf_counter() - start
+            store = ANNSimilarity(ids, features, index, candidates_per_item=per_item, source=features_dir)
+            sizes = [len(store.candidates(positions)) for positions, _ in profiles]
+            report = compare(reference, store, profiles, k=k)
+            rows.append({
+                "tables": n_tables,
+                "bits": n_bits,
+                "candidates_per_item": per_item,
+                "mean_candidates": float(np.mean(sizes)),
+                "build_seconds": build_seconds,
+                **report,
+            })
+    return rows
+
+
+def quantized_copy(dense, dtype, block_rows=1024):
+    """在内存中按 dtype 重新编码稠密矩阵（与 similarity_store.py quantize 写出的结果一致）"""
+    n = len(dense)
+    matrix = np.empty((n, n), dtype=dtype)
+    scales = np.ones(n, dtype=np.float32) if dtype == "int8" else None
+    for start in range(0, n, block_rows):
+        values, block_scales = quantize(dense.rows(slice(start, start + block_rows)), dtype)
+        matrix[start:start + len(values)] = values
+        if scales is not None:
+            scales[start:start + len(values)] = block_scales
+    return DenseSimilarity(dense.ids, matrix, source=dense.source, scales=scales)
+
+
+def precision_report(reference, dtypes, profiles, k=10, sample_rows=64, seed=0):
+    """
+    以 reference（建议 float64 的 cosine_similarity.csv）为基准，对每种存储 dtype 统计：
+    内存、recall@K、用户打分的最大/平均绝对误差、抽样矩阵元素的最大绝对误差、延迟。
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(reference), size=min(sample_rows, len(reference)), replace=False)
+    exact_rows = reference.rows(rows).astype(np.float64)
+    report = []
+    for dtype in dtypes:
+        store = quantized_copy(reference, dtype)
+        score_errors = []
+        for positions, weights in profiles:
+            expected = reference.weighted_scores(positions, weights) / weights.sum()
+            got = store.weighted_scores(positions, weights) / weights.sum()
+            score_errors.append(np.abs(got - expected))
+        score_errors = np.concatenate(score_errors)
+        report.append({
+            "dtype": dtype,
+            "memory_ratio": reference.nbytes / store.nbytes,
+            "score_error_max": float(score_errors.max()),
+            "score_error_mean": float(score_errors.mean()),
+            "element_error_max": float(np.abs(store.rows(rows) - exact_rows).max()),
+            **compare(reference, store, profiles, k=k),
+        })
+    return report
+
+
+def print_report(report):
+    k = report["k"]
+    print(f"users={report['users']}  recall@{k} mean={report[f'recall@{k}_mean']:.4f} "
+          f"min={report[f'recall@{k}_min']:.4f}")
+    for side in ("reference", "candidate"):
+        r = report[side]
+        print(f"  {side:<9} {r['kind']:<6} {r['mib']:>10.1f} MiB  "
+              f"mean={r['mean_ms']:.3f}ms p50={r['p50_ms']:.3f}ms p99={r['p99_ms']:.3f}ms")
+
+
+# -----------------------------
+# 3) 命令行
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare recommendation quality and latency between similarity stores")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_compare = sub.add_parser("compare", help="Compare a candidate store against a dense reference")
+    p_compare.add_argument("reference", help="Dense reference: cosine_similarity.csv or binary directory")
+    p_compare.add_argument("candidate", help="Candidate store directory, e.g. ./data/similarity_topk")
+    p_compare.add_argument("--users", type=int, default=200)
+    p_compare.add_argument("--max-items", type=int, default=10, help="Max interactions per simulated user")
+    p_compare.add_argument("--k", type=int, default=10)
+    p_compare.add_argument("--seed", type=int, default=0)
+
+    p_bench = sub.add_parser("bench-restricted", help="Benchmark candidate-restricted scoring against full scoring")
+    p_bench.add_argument("store", help="cosine_similarity.csv or a binary directory")
+    p_bench.add_argument("--sizes", default="10,100,1000,10000", help="Comma-separated candidate set sizes")
+    p_bench.add_argument("--users", type=int, default=200)
+    p_bench.add_argument("--max-items", type=int, default=10, help="Max interactions per simulated user")
+    p_bench.add_argument("--k", type=int, default=10)
+    p_bench.add_argument("--seed", type=int, default=0)
+
+    p_ann = sub.add_parser("ann", help="Sweep LSH candidate generation settings against the exact dense path")
+    p_ann.add_argument("reference", help="Dense reference: cosine_similarity.csv or binary directory")
+    p_ann.add_argument("--features", help="build_similarity.py output directory with features.npy "
+                                          "(defaults to the reference directory)")
+    p_ann.add_argument("--tables", default="4,8,16", help="Comma-separated numbers of hash tables")
+    p_ann.add_argument("--candidates", default="100,300,1000", help="Comma-separated candidates per interacted listing")
+    p_ann.add_argument("--bits", type=int, default=0, help="Hyperplanes per table (0 = chosen from catalog size)")
+    p_ann.add_argument("--users", type=int, default=200)
+    p_ann.add_argument("--max-items", type=int, default=10, help="Max interactions per simulated user")
+    p_ann.add_argument("--k", type=int, default=10)
+    p_ann.add_argument("--seed", type=int, default=0)
+
+    p_precision = sub.add_parser("precision", help="Compare quantized dense storage dtypes against float64")
+    p_precision.add_argument("reference", help="Dense reference, ideally the float64 cosine_similarity.csv")
+    p_precision.add_argument("--dtypes", default="float32,float16,int8", help="Comma-separated storage dtypes")
+    p_precision.add_argument("--users", type=int, default=200)
+    p_precision.add_argument("--max-items", type=int, default=10, help="Max interactions per simulated user")
+    p_precision.add_argument("--k", type=int, default=10)
+    p_precision.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+    if args.command == "precision":
+        reference = open_similarity(args.reference, mmap=False)
+        if reference.kind != "dense":
+            parser.error(f"{args.reference} is not a dense similarity matrix")
+        profiles = sample_profiles(len(reference), args.users, args.max_items, seed=args.seed)
+        dtypes = [d for d in args.dtypes.split(",") if d]
+        print(f"reference {reference.dtype}: {len(reference)} listings, {reference.nbytes / 2**20:.1f} MiB")
+        for row in precision_report(reference, dtypes, profiles, k=args.k, seed=args.seed):
+            c, k = row["candidate"], row["k"]
+            print(f"  {row['dtype']:<8} {c['mib']:>10.1f} MiB ({row['memory_ratio']:.1f}x smaller)  "
+                  f"recall@{k} mean={row[f'recall@{k}_mean']:.4f} min={row[f'recall@{k}_min']:.4f}  "
+                  f"score err max={row['score_error_max']:.2e} mean={row['score_error_mean']:.2e}  "
+                  f"element err max={row['element_error_max']:.2e}  p50={c['p50_ms']:.3f}ms")
+    elif args.command == "ann":
+        reference = open_similarity(args.reference)
+        profiles = sample_profiles(len(reference), args.users, args.max_items, seed=args.seed)
+        tables = [int(s) for s in args.tables.split(",") if s]
+        candidates = [int(s) for s in args.candidates.split(",") if s]
+        rows = ann_sweep(reference, args.features or args.reference, profiles, tables, candidates,
+                         k=args.k, bits=args.bits, seed=args.seed)
+        ref = rows[0]["reference"] if rows else None
+        if ref:
+            print(f"exact {ref['kind']}: {len(reference)} listings, p50={ref['p50_ms']:.3f}ms p99={ref['p99_ms']:.3f}ms")
+        for row in rows:
+            c, k = row["candidate"], row["k"]
+            print(f"  tables={row['tables']:>3} bits={row['bits']:>2} per_item={row['candidates_per_item']:>5}  "
+                  f"scored={row['mean_candidates']:>9.0f}  recall@{k} mean={row[f'recall@{k}_mean']:.4f} "
+                  f"min={row[f'recall@{k}_min']:.4f}  p50={c['p50_ms']:.3f}ms p99={c['p99_ms']:.3f}ms  "
+                  f"build={row['build_seconds']:.1f}s")
+    elif args.command == "bench-restricted":
+        store = open_similarity(args.store)
+        profiles = sample_profiles(len(store), args.users, args.max_items, seed=args.seed)
+        sizes = [int(s) for s in args.sizes.split(",") if s]
+        print(f"{store.kind} store, {len(store)} listings, {args.users} users, k={args.k}")
+        for row in bench_restricted(store, profiles, sizes, k=args.k, seed=args.seed):
+            r, f = row["restricted"], row["full"]
+            print(f"  candidates={row['candidates']:>7}  restricted p50={r['p50_ms']:.3f}ms p99={r['p99_ms']:.3f}ms  "
+                  f"full+filter p50={f['p50_ms']:.3f}ms p99={f['p99_ms']:.3f}ms  mismatches={row['mismatches']}")
+    elif args.command == "compare":
+        reference = open_similarity(args.reference)
+        candidate = open_similarity(args.candidate)
+        profiles = sample_profiles(len(reference), args.users, args.max_items, seed=args.seed)
+        print_report(compare(reference, candidate, profiles, k=args.k))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
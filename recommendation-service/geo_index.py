@@ -0,0 +1,83 @@
+"""
+房源经纬度网格索引
+
+把经纬度有效的房源按固定大小的网格（默认 0.01°，约 1.1 km）分桶，
+桶内行号按网格编号排序保存（CSR）。半径查询：
+  1) 由半径换算出覆盖圆的经纬度包围盒，只取包围盒内的网格
+  2) 对这些网格中的房源计算精确 Haversine 距离
+工作量与半径内（附近）房源数成正比，而不是全表。
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Haversine 球面距离（km），参数可为标量或数组（角度）"""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GridIndex:
+    """
+    latitude / longitude: 每个房源的经纬度数组（角度）
+    valid: 经纬度是否有效，无效的房源不进入索引
+    """
+
+    def __init__(self, latitude, longitude, valid=None, cell_deg=0.01):
+        self.cell_deg = float(cell_deg)
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        valid = np.ones(len(self.latitude), dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+
+        rows = np.flatnonzero(valid)
+        cells = self._cells(self.latitude[rows], self.longitude[rows])
+        order = np.argsort(cells, kind="stable")
+        self.rows = rows[order]
+        self.cells = cells[order]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _cells(self, lat, lon):
+        # 纬度 [-90, 90] 与经度 [-180, 180] 各自离散化后合成一个 int64 编号
+        lat_cell = np.floor((np.asarray(lat) + 90.0) / self.cell_deg).astype(np.int64)
+        lon_cell = np.floor((np.asarray(lon) + 180.0) / self.cell_deg).astype(np.int64)
+        return lat_cell * self._lon_cells + lon_cell
+
+    @property
+    def _lon_cells(self):
+        return int(math.ceil(360.0 / self.cell_deg)) + 1
+
+    def within(self, lat, lon, radius_km):
+        """返回半径内房源的行号（升序）与对应距离（km）"""
+        lat, lon, radius_km = float(lat), float(lon), float(radius_km)
+        if radius_km < 0 or not (-90.0 <= lat <= 90.0) or not (-180.0 <= lon <= 180.0):
+            raise ValueError("Location must have -90 <= lat <= 90, -180 <= lon <= 180 and radius_km >= 0")
+
+        dlat = radius_km / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 90.0)))
+        dlon = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+
+        lat_lo = math.floor((max(lat - dlat, -90.0) + 90.0) / self.cell_deg)
+        lat_hi = math.floor((min(lat + dlat, 90.0) + 90.0) / self.cell_deg)
+        lon_lo = math.floor((max(lon - dlon, -180.0) + 180.0) / self.cell_deg)
+        lon_hi = math.floor((min(lon + dlon, 180.0) + 180.0) / self.cell_deg)
+
+        # 每个纬度网格行在排序数组中对应一段连续区间 [lon_lo, lon_hi]
+        lat_cells = np.arange(lat_lo, lat_hi + 1, dtype=np.int64) * self._lon_cells
+        starts = np.searchsorted(self.cells, lat_cells + lon_lo, side="left")
+        stops = np.searchsorted(self.cells, lat_cells + lon_hi, side="right")
+        counts = stops - starts
+        gather = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        rows = self.rows[gather]
+
+        distances = haversine_km(lat, lon, self.latitude[rows], self.longitude[rows])
+        keep = distances <= radius_km
+        rows, distances = rows[keep], distances[keep]
+        order = np.argsort(rows)
+        return rows[order], distances[order]
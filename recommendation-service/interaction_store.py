@@ -0,0 +1,239 @@
+"""
+用户交互存储
+
+按 user_id 保存每个用户的交互记录，替换/查询均为 O(1)：
+  - 每个用户一条不可变记录，listing 行号、like、views 以紧凑的 NumPy 数组保存
+  - 写操作在锁内整体替换记录，读操作无需加锁（读到的要么是旧记录，要么是新记录）
+  - 可选快照：save()/restore() 以 .npz 格式落盘，替代启动时读取 interactions.xlsx/csv
+  - 多进程（gunicorn）时每个进程只把自己改动过的用户写成增量快照 <快照>.part-<pid>-<ns>.npz
+    （save_changes()），不覆盖主快照；compact_snapshot() 按每个用户的修改时间合并增量并写回主快照。
+    这样 master 进程 fork 前载入的旧数据和各 worker 的写入不会互相覆盖
+"""
+import glob
+import os
+import threading
+import time
+
+import numpy as np
+
+from result_cache import fingerprint
+
+
+class UserInteractions:
+    """
+    单个用户的交互记录（不可变）。
+    positions 按 lookup（写入时的 listing_id -> 行号字典）解析；
+    fingerprint 为交互内容的哈希，用作结果缓存键的一部分。
+    """
+    __slots__ = ("listing_ids", "positions", "lookup", "likes", "views", "fingerprint")
+
+    def __init__(self, listing_ids, positions, likes, views, lookup=None):
+        self.listing_ids = tuple(listing_ids)
+        self.positions = positions
+        self.lookup = lookup
+        self.likes = likes
+        self.views = views
+        self.fingerprint = fingerprint("\x1f".join(self.listing_ids), likes.tobytes(), views.tobytes())
+
+    def __len__(self):
+        return len(self.listing_ids)
+
+    def positions_for(self, lookup):
+        """按给定索引取行号；索引已切换（热加载）但记录尚未重新解析时现场解析"""
+        if lookup is self.lookup:
+            return self.positions
+        return np.fromiter((lookup.get(lid, -1) for lid in self.listing_ids), dtype=np.int32, count=len(self))
+
+    def weights(self, alpha):
+        """兴趣分数 = α * like + views"""
+        return alpha * self.likes.astype(np.float64) + self.views
+
+
+class InteractionStore:
+    """
+    线程安全的 user_id -> UserInteractions 映射。
+    lookup: listing_id -> 相似度矩阵行号 的字典，用于写入时预先解析行号（不存在为 -1）。
+    """
+
+    def __init__(self, lookup):
+        self._lookup = lookup
+        self._users = {}
+        self._updated = {}  # user_id -> 最后修改时间（time.time()），合并增量快照时新的覆盖旧的
+        self._changed = set()  # 上次 save_changes() / mark_saved() 之后本进程改动过的用户
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._users)
+
+    def __contains__(self, user_id):
+        return str(user_id) in self._users
+
+    def get(self, user_id):
+        return self._users.get(str(user_id))
+
+    def _record(self, listing_ids, likes, views, lookup):
+        listing_ids = [str(lid) for lid in listing_ids]
+        positions = np.fromiter((lookup.get(lid, -1) for lid in listing_ids), dtype=np.int32, count=len(listing_ids))
+        return UserInteractions(
+            listing_ids,
+            positions,
+            np.asarray(likes, dtype=np.int32),
+            np.asarray(views, dtype=np.int32),
+            lookup=lookup,
+        )
+
+    def replace(self, user_id, listing_ids, likes, views, updated_at=None):
+        """用本次交互整体覆盖该用户的历史记录；updated_at 默认为当前时间"""
+        record = self._record(listing_ids, likes, views, self._lookup)
+        user_id = str(user_id)
+        with self._lock:
+            self._users[user_id] = record
+            self._updated[user_id] = time.time() if updated_at is None else updated_at
+            self._changed.add(user_id)
+        return record
+
+    def remove(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            self._updated[user_id] = time.time()
+            self._changed.add(user_id)
+            return self._users.pop(user_id, None)
+
+    def reindex(self, lookup):
+        """相似度矩阵的行号发生变化时，按 listing_id 重新解析所有用户的行号"""
+        with self._lock:
+            self._lookup = lookup
+            self._users = {
+                user_id: self._record(r.listing_ids, r.likes, r.views, lookup)
+                for user_id, r in self._users.items()
+            }
+
+    # -----------------------------
+    # 导入 / 快照
+    # -----------------------------
+    def load_frame(self, df):
+        """从旧版 interactions DataFrame（user_id, listing_id, like, views）导入，修改时间记为 0（早于任何快照）"""
+        if df.empty:
+            return 0
+        df = df.drop_duplicates(subset=["user_id", "listing_id"], keep="last")
+        for user_id, rows in df.groupby(df["user_id"].astype(str), sort=False):
+            self.replace(
+                user_id,
+                rows["listing_id"].astype(str).tolist(),
+                rows["like"].fillna(0).astype(int).to_numpy(),
+                rows["views"].fillna(0).astype(int).to_numpy(),
+                updated_at=0.0,
+            )
+        return len(self._users)
+
+    def mark_saved(self):
+        """当前内容已在磁盘上（启动载入后调用），之后的 save_changes() 只写此后的改动"""
+        with self._lock:
+            self._changed.clear()
+
+    @staticmethod
+    def _write(path, entries):
+        """entries: [(user_id, UserInteractions 或 None（已删除）, 修改时间)]，先写临时文件再原子替换"""
+        empty = np.empty(0, dtype=np.int32)
+        records = [r for _, r, _ in entries]
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                user_ids=np.array([u for u, _, _ in entries], dtype=str),
+                offsets=np.cumsum([0] + [len(r) if r is not None else 0 for r in records]).astype(np.int64),
+                listing_ids=np.array([lid for r in records if r is not None for lid in r.listing_ids], dtype=str),
+                likes=np.concatenate([empty] + [r.likes for r in records if r is not None]),
+                views=np.concatenate([empty] + [r.views for r in records if r is not None]),
+                updated_at=np.array([t for _, _, t in entries], dtype=np.float64),
+            )
+        os.replace(tmp, path)
+
+    def _read(self, path):
+        """读取 .npz 快照：{user_id: (UserInteractions 或 None（已删除）, 修改时间)}；旧快照没有修改时间，记为 0"""
+        with np.load(path, allow_pickle=False) as snap:
+            user_ids = snap["user_ids"].tolist()
+            offsets = snap["offsets"]
+            listing_ids = snap["listing_ids"].tolist()
+            likes, views = snap["likes"], snap["views"]
+            updated = snap["updated_at"] if "updated_at" in snap.files else np.zeros(len(user_ids))
+        entries = {}
+        for i, user_id in enumerate(user_ids):
+            lo, hi = offsets[i], offsets[i + 1]
+            record = self._record(listing_ids[lo:hi], likes[lo:hi], views[lo:hi], self._lookup) if hi > lo else None
+            entries[user_id] = (record, float(updated[i]))
+        return entries
+
+    def save(self, path):
+        """把所有用户交互写成 .npz 快照（主快照）"""
+        with self._lock:
+            entries = [(u, r, self._updated.get(u, 0.0)) for u, r in self._users.items()]
+        self._write(path, entries)
+        return len(entries)
+
+    def save_changes(self, path):
+        """
+        把本进程改动过的用户写成增量快照 <path>.part-<pid>-<ns>.npz，返回 (文件路径, 用户数)；
+        没有改动时返回 (None, 0)。写入失败时改动保留，下次再写
+        """
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            entries = [(u, self._users.get(u), self._updated.get(u, 0.0)) for u in changed]
+        if not entries:
+            return None, 0
+        part = f"{path}.part-{os.getpid()}-{time.time_ns()}.npz"
+        try:
+            self._write(part, entries)
+        except Exception:
+            with self._lock:
+                self._changed |= changed
+            raise
+        return part, len(entries)
+
+    def restore(self, path):
+        """从 .npz 快照恢复；行号按当前相似度矩阵重新解析"""
+        entries = self._read(path)
+        with self._lock:
+            self._users = {u: r for u, (r, _) in entries.items() if r is not None}
+            self._updated = {u: t for u, (_, t) in entries.items()}
+        return len(self._users)
+
+    def merge(self, path):
+        """合并一个（增量）快照：每个用户保留修改时间较新的记录，返回采用的用户数"""
+        taken = 0
+        entries = self._read(path)
+        with self._lock:
+            for user_id, (record, updated_at) in entries.items():
+                if updated_at < self._updated.get(user_id, float("-inf")):
+                    continue
+                if record is None:
+                    self._users.pop(user_id, None)
+                else:
+                    self._users[user_id] = record
+                self._updated[user_id] = updated_at
+                taken += 1
+        return taken
+
+
+def snapshot_parts(path):
+    """path 的增量快照文件（按文件名排序）"""
+    return sorted(glob.glob(f"{glob.escape(path)}.part-*.npz"))
+
+
+def compact_snapshot(path):
+    """
+    把 path 的增量快照按用户修改时间合并进主快照（原子替换）并删除已合并的增量，返回合并的增量数。
+    须在没有其他进程写增量时调用：gunicorn 为 fork 前（master 载入时）和所有 worker 退出后（on_exit）
+    """
+    parts = snapshot_parts(path)
+    if not parts:
+        return 0
+    store = InteractionStore({})
+    if os.path.exists(path):
+        store.restore(path)
+    for part in parts:
+        store.merge(part)
+    store.save(path)
+    for part in parts:
+        os.remove(part)
+    return len(parts)
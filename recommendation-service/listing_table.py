@@ -0,0 +1,107 @@
+"""
+房源表（listings.csv）
+
+启动时一次性预处理为按 id 索引的列式表：
+  - 数值列（经纬度、价格、评分）提前转为 float64，inf / NaN 清洗为 0
+  - 价格去掉 "$" 与千分位逗号
+  - 文本列的缺失值转为 None
+之后 /recommend_map 只需按行号收集 K 行，不再复制、转换或 merge 整张表。
+经纬度同时建立网格索引（geo_index.py），用于按位置筛选候选房源。
+"""
+import numpy as np
+import pandas as pd
+
+from geo_index import GridIndex
+
+NUMERIC_COLUMNS = ["latitude", "longitude", "price", "review_scores_rating"]
+# 输出字段名 -> listings.csv 列名
+TEXT_COLUMNS = {
+    "name": "name",
+    "neighbourhood": "neighbourhood_cleansed",
+    "region": "neighbourhood_group_cleansed",
+    "property_type": "property_type",
+}
+
+
+class ListingTable:
+    """
+    ids: listing_id（字符串）
+    positions: listing_id -> 行号（重复 id 取第一条）
+    has_coordinates: 原始经纬度是否有效（无效的房源不会出现在地图结果中，也不进入网格索引）
+    similarity_rows: 每个房源在相似度矩阵中的行号（-1 为不在矩阵中），由 link() 设置
+    """
+
+    def __init__(self, df):
+        self.ids = df["id"].astype(str).tolist()
+        self.positions = {}
+        for i, lid in enumerate(self.ids):
+            self.positions.setdefault(lid, i)
+
+        self.numeric = {}
+        for col in NUMERIC_COLUMNS:
+            values = df[col] if col in df.columns else pd.Series(np.nan, index=df.index)
+            if col == "price" and not pd.api.types.is_numeric_dtype(values):
+                values = values.astype(str).str.replace(r"[\$,]", "", regex=True)
+            self.numeric[col] = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+        self.has_coordinates = np.isfinite(self.numeric["latitude"]) & np.isfinite(self.numeric["longitude"])
+        for col, values in self.numeric.items():
+            self.numeric[col] = np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0)
+        self.geo = GridIndex(self.numeric["latitude"], self.numeric["longitude"], valid=self.has_coordinates)
+        self.similarity_rows = None
+
+        self.text = {}
+        for field, col in TEXT_COLUMNS.items():
+            values = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+            self.text[field] = values.astype(object).where(values.notna(), None).tolist()
+
+    @classmethod
+    def from_csv(cls, path, encoding="latin1"):
+        return cls(pd.read_csv(path, encoding=encoding))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def link(self, lookup):
+        """lookup: listing_id -> 相似度矩阵行号；预先解析每个房源的行号，位置查询时直接映射"""
+        self.similarity_rows = np.fromiter((lookup.get(lid, -1) for lid in self.ids), dtype=np.int64,
+                                           count=len(self.ids))
+        return self
+
+    def rows_within(self, lat, lon, radius_km):
+        """半径内房源在相似度矩阵中的行号（去重、升序；需先调用 link()）"""
+        positions, _ = self.geo.within(lat, lon, radius_km)
+        rows = self.similarity_rows[positions]
+        return np.unique(rows[rows >= 0])
+
+    def gather(self, recs):
+        """
+        按推荐结果顺序收集地图展示字段。
+        recs: [{"listing_id", "recommend_score", "seen"}, ...]
+        返回 (结果列表, 缺失 listing_id 列表)
+        """
+        found, missing = [], []
+        for rec in recs:
+            pos = self.positions.get(str(rec["listing_id"]))
+            if pos is None or not self.has_coordinates[pos]:
+                missing.append(str(rec["listing_id"]))
+            else:
+                found.append((pos, rec))
+
+        rows = np.fromiter((pos for pos, _ in found), dtype=np.int64, count=len(found))
+        numeric = {col: values[rows].tolist() for col, values in self.numeric.items()}
+        results = []
+        for i, (pos, rec) in enumerate(found):
+            results.append({
+                "listing_id": str(rec["listing_id"]),
+                "name": self.text["name"][pos],
+                "latitude": numeric["latitude"][i],
+                "longitude": numeric["longitude"][i],
+                "price": numeric["price"][i],
+                "review_scores_rating": numeric["review_scores_rating"][i],
+                "neighbourhood": self.text["neighbourhood"][pos],
+                "region": self.text["region"][pos],
+                "property_type": self.text["property_type"][pos],
+                "recommend_score": rec["recommend_score"],
+                "seen": rec["seen"],
+            })
+        return results, missing
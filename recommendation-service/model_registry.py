@@ -0,0 +1,136 @@
+"""
+模型快照与热加载
+
+一个 ModelSnapshot = 相似度矩阵 + 房源表 + 版本号。
+请求开始时取一次 registry.active，整个请求都使用这份快照；
+reload 在后台线程中加载并校验新快照，成功后原子替换 active 引用，
+正在处理的请求继续使用旧快照，旧快照在没有引用后被回收。
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class ModelSnapshot:
+    def __init__(self, version, similarity, listings, sources, load_seconds):
+        self.version = version
+        self.similarity = similarity
+        self.listings = listings
+        self.sources = sources
+        self.loaded_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.load_seconds = load_seconds
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 3),
+            "similarity": {"kind": self.similarity.kind, "listings": len(self.similarity),
+                           "source": self.similarity.source},
+            "listings": len(self.listings),
+        }
+
+
+def validate_snapshot(similarity, listings):
+    """新快照上线前的基本校验；不通过则抛出 ValueError，保持旧快照不变"""
+    if len(similarity) == 0:
+        raise ValueError("Similarity index is empty")
+    if len(listings) == 0:
+        raise ValueError("Listings table is empty")
+    if len(set(similarity.ids)) != len(similarity.ids):
+        raise ValueError("Similarity index contains duplicate listing ids")
+    # 抽查若干行，确保打分结果有限（ann 模式非候选房源为 -inf，属正常）
+    sample = np.linspace(0, len(similarity) - 1, num=min(8, len(similarity)), dtype=np.int64)
+    scores = similarity.weighted_scores(sample, np.ones(len(sample)))
+    if np.isnan(scores).any() or np.isposinf(scores).any() or not np.isfinite(scores).any():
+        raise ValueError("Similarity index contains non-finite values")
+
+
+def source_signature(paths):
+    """数据文件的 (路径, 修改时间) 列表，用于判断是否需要重新加载"""
+    signature = []
+    for path in paths:
+        try:
+            signature.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            signature.append((path, None))
+    return tuple(signature)
+
+
+class ModelRegistry:
+    """
+    loader: 无参函数，返回 (similarity, listings, sources)；sources 为数据文件路径列表。
+    on_swap: 新快照上线后的回调（例如重新解析交互行号、清空结果缓存）。
+    """
+
+    def __init__(self, loader, on_swap=None):
+        self._loader = loader
+        self._on_swap = on_swap
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._reloading = False
+        self._watcher = None
+        self.active = None
+        self.last_error = None
+        self.last_attempt = None
+
+    def load(self):
+        """同步加载、校验并切换到新快照"""
+        start = time.perf_counter()
+        similarity, listings, sources = self._loader()
+        validate_snapshot(similarity, listings)
+        with self._lock:
+            self._counter += 1
+            version = f"{time.strftime('%Y%m%dT%H%M%S')}-{self._counter}"
+            snapshot = ModelSnapshot(version, similarity, listings, source_signature(sources),
+                                     time.perf_counter() - start)
+            self.active = snapshot
+        if self._on_swap is not None:
+            self._on_swap(snapshot)
+        return snapshot
+
+    def reload_async(self):
+        """后台重新加载；已有重新加载在进行时返回 False"""
+        with self._lock:
+            if self._reloading:
+                return False
+            self._reloading = True
+        threading.Thread(target=self._reload, name="model-reload", daemon=True).start()
+        return True
+
+    def _reload(self):
+        self.last_attempt = time.strftime("%Y-%m-%dT%H:%M:%S")
+        try:
+            self.load()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def start_watcher(self, interval):
+        """每 interval 秒检查数据文件修改时间，有变化时自动重新加载（多进程部署时每个 worker 各自检查）"""
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                active = self.active
+                if active is not None and source_signature(p for p, _ in active.sources) != active.sources:
+                    self.reload_async()
+
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def status(self):
+        active = self.active
+        return {
+            "active": active.describe() if active is not None else None,
+            "reloading": self._reloading,
+            "last_attempt": self.last_attempt,
+            "last_error": self.last_error,
+        }
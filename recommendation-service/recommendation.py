@@ -1,7 +1,19 @@
+import atexit
+import os
+
 from flask import Flask, request, jsonify
 from werkzeug.exceptions import BadRequest
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
+
+import config
+from similarity_store import open_similarity, is_binary_store, build_topk, top_k_positions, META_FILE
+from ann_index import open_ann
+from model_registry import ModelRegistry
+from interaction_store import InteractionStore, compact_snapshot
+from listing_table import ListingTable
+from result_cache import ResultCache, fingerprint
 
 # -----------------------------
 # 0) App init
@@ -11,20 +23,73 @@ app = Flask(__name__)
 # -----------------------------
 # 1) 载入数据（与原版一致）
 # -----------------------------
-# 相似度矩阵（索引=候选listing，列=候选listing）
-similarity_df = pd.read_csv("./data/cosine_similarity.csv", index_col=0)
-
-# 交互（若有 excel 优先）
-try:
-    interactions = pd.read_excel("interactions.xlsx")
-except Exception:
+# 相似度矩阵（索引=候选listing，列=候选listing），配置见 config.py
+def load_similarity(mode=config.SIMILARITY_MODE):
+    if mode == "ann":
+        return open_ann(config.SIMILARITY_FEATURES_PATH, n_tables=config.ANN_TABLES, n_bits=config.ANN_BITS,
+                        candidates_per_item=config.ANN_CANDIDATES)
+    if mode == "topk" and is_binary_store(config.SIMILARITY_TOPK_PATH):
+        return open_similarity(config.SIMILARITY_TOPK_PATH)
+    dense_path = config.SIMILARITY_PATH if is_binary_store(config.SIMILARITY_PATH) else config.SIMILARITY_CSV
+    dense = open_similarity(dense_path)
+    if mode == "topk":
+        return build_topk(dense, config.SIMILARITY_TOPK_K)
+    if mode != "dense":
+        raise ValueError(f"Unknown SIMILARITY_MODE: {mode}")
+    return dense
+
+
+def _source_file(path):
+    """用于判断数据是否更新的文件：二进制目录看 meta.json（最后写入），CSV 看文件本身"""
+    return os.path.join(path, META_FILE) if is_binary_store(path) else path
+
+
+def load_model():
+    """加载一份模型快照：(相似度矩阵, 房源表（按 id 索引的列式表）, 数据文件列表)"""
+    similarity = load_similarity()
+    listings = ListingTable.from_csv(config.LISTINGS_CSV).link(similarity.positions)
+    sources = [_source_file(similarity.source), config.LISTINGS_CSV] if similarity.source else [config.LISTINGS_CSV]
+    return similarity, listings, sources
+
+
+def _on_model_swap(snapshot):
+    # 新快照行号可能变化：重新解析交互行号，旧结果缓存全部作废
+    interactions.reindex(snapshot.similarity.positions)
+    result_cache.clear()
+
+
+interactions = InteractionStore({})
+result_cache = ResultCache(maxsize=config.RESULT_CACHE_SIZE, ttl=config.RESULT_CACHE_TTL)
+
+# 模型快照（相似度矩阵 + 房源表），可通过 POST /admin/reload 热加载
+models = ModelRegistry(load_model, on_swap=_on_model_swap)
+models.load()
+models.start_watcher(config.MODEL_RELOAD_POLL)
+
+# 交互：先把上次运行各进程留下的增量快照合并进主快照，再恢复；没有快照时从旧版 interactions.xlsx / interactions.csv 导入
+# （gunicorn 下这段在 master fork 之前执行，只有一个进程）
+if config.INTERACTIONS_SNAPSHOT:
+    compact_snapshot(config.INTERACTIONS_SNAPSHOT)
+if config.INTERACTIONS_SNAPSHOT and os.path.exists(config.INTERACTIONS_SNAPSHOT):
+    interactions.restore(config.INTERACTIONS_SNAPSHOT)
+else:
     try:
-        interactions = pd.read_csv("interactions.csv", sep=None, engine="python", encoding="utf-8")
+        interactions.load_frame(pd.read_excel("interactions.xlsx"))
     except Exception:
-        interactions = pd.DataFrame(columns=["user_id", "listing_id", "like", "views"])
+        try:
+            interactions.load_frame(pd.read_csv("interactions.csv", sep=None, engine="python", encoding="utf-8"))
+        except Exception:
+            pass
+    if config.INTERACTIONS_SNAPSHOT and len(interactions):
+        interactions.save(config.INTERACTIONS_SNAPSHOT)
+interactions.mark_saved()
 
-# 房源表
-listings = pd.read_csv("./data/listings.csv", encoding="latin1")
+
+@atexit.register
+def _save_interactions():
+    # 每个进程只写自己改动过的用户（增量快照），不覆盖主快照；master 没有改动，不写任何文件
+    if config.INTERACTIONS_SNAPSHOT:
+        interactions.save_changes(config.INTERACTIONS_SNAPSHOT)
 
 # -----------------------------
 # 2) 工具函数
@@ -42,17 +107,20 @@ def _str2bool(v, default=False):
     return default
 
 # -----------------------------
-# 3) 推荐函数（与原文件一致）
+# 3) 推荐函数
 # -----------------------------
-def recommend_for_user(user_id, top_k=10, alpha=2.0, include_seen=False, queries=[]):
+def recommend_for_user(user_id, top_k=10, alpha=2.0, include_seen=False, queries=[], location=None):
     """
     根据用户交互记录计算房源推荐结果。
     include_seen: 是否包含用户已看过或已点赞的房源
+    location: (lat, lon, radius_km)，只在半径内的房源中推荐（与 queries 同时给出时取交集）
     """
-    global interactions, similarity_df
+    # 整个请求使用同一份模型快照，热加载不影响进行中的请求
+    model = models.active
+    similarity = model.similarity
 
-    user_data = interactions[interactions["user_id"] == user_id]
-    if user_data.empty:
+    record = interactions.get(user_id)
+    if record is None or len(record) == 0:
         return {
             "user_id": user_id,
             "count": 0,
@@ -61,22 +129,23 @@ def recommend_for_user(user_id, top_k=10, alpha=2.0, include_seen=False, queries
             "message": "No interactions found for this user."
         }
 
-    # 确保索引/列都是字符串
-    similarity_df.index = similarity_df.index.astype(str)
-    similarity_df.columns = similarity_df.columns.astype(str)
+    # 相同交互 + 相同参数 -> 直接返回缓存的 Top-K
+    cache_key = (model.version, str(user_id), record.fingerprint, float(alpha), bool(include_seen), int(top_k),
+                 fingerprint(*sorted({str(q) for q in queries})) if queries else None, location)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     # 兴趣分数 = α * like + views
-    user_data = user_data.copy()
-    user_data["score"] = alpha * user_data["like"] + user_data["views"]
-    liked_ids = [str(i) for i in user_data["listing_id"].values]
-    weights = user_data["score"].values
+    weights = record.weights(alpha)
 
-    # 有效/无效ID划分
-    valid_ids = [lid for lid in liked_ids if lid in similarity_df.index]
-    invalid_ids = [lid for lid in liked_ids if lid not in similarity_df.index]
+    # 有效/无效ID划分（写入时已解析行号，-1 表示不在相似度矩阵中）
+    positions = record.positions_for(similarity.positions)
+    valid = positions >= 0
+    invalid_ids = [lid for lid, ok in zip(record.listing_ids, valid) if not ok]
 
     # 无有效ID -> 直接返回
-    if len(valid_ids) == 0:
+    if not valid.any():
         return {
             "user_id": user_id,
             "count": 0,
@@ -85,41 +154,167 @@ def recommend_for_user(user_id, top_k=10, alpha=2.0, include_seen=False, queries
             "message": "All listing_id are invalid — cannot generate recommendation."
         }
 
-    # 取相似度子矩阵并加权
-    sim_subset = similarity_df.loc[valid_ids]
-    weights = weights[:len(valid_ids)]
-    weighted_scores = np.dot(weights, sim_subset.values) / weights.sum()
+    # 取相似度行并加权（权重与有效ID一一对应）
+    # queries 不为空时只收集候选列打分（查询这些房源的偏好顺序, 而不是全局的）
+    seen_positions = positions[valid]
+    weights = weights[valid]
+    # ann 模式没有 queries 时由 LSH 生成候选，只对候选打分、排序
+    candidates = _candidate_positions(similarity, queries) if queries else None
+    if location is not None:
+        nearby = model.listings.rows_within(*location)
+        candidates = nearby if candidates is None else np.intersect1d(candidates, nearby, assume_unique=True)
+        if len(candidates) == 0:
+            return {
+                "user_id": user_id,
+                "count": 0,
+                "recommendations": [],
+                "invalid_ids": invalid_ids,
+                "message": "No listings found within the given location.",
+                "location_empty": True
+            }
+    if candidates is None and similarity.kind == "ann":
+        candidates = similarity.candidates(seen_positions)
+    scores = similarity.weighted_scores(seen_positions, weights, columns=candidates)
+    total = weights.sum()
+    if total > 0:
+        scores /= total
+
+    recs = _rank(similarity, scores, seen_positions, top_k, include_seen=include_seen, candidates=candidates)
+
+    result = {
+        "user_id": user_id,
+        "count": len(recs),
+        "recommendations": recs,
+        "invalid_ids": invalid_ids,
+        "message": "Recommendation generated successfully."
+    }
+    result_cache.put(cache_key, str(user_id), result)
+    return result
+
+
+def _listing_positions(similarity, listing_ids):
+    """listing_id 列表 -> 相似度矩阵行号数组（不存在为 -1）"""
+    lookup = similarity.positions
+    return np.fromiter((lookup.get(lid, -1) for lid in listing_ids), dtype=np.int64, count=len(listing_ids))
 
-    rec_df = pd.DataFrame({
-        "listing_id": similarity_df.columns,
-        "recommend_score": weighted_scores
-    })
 
-    # 标记是否已看过
-    rec_df["seen"] = rec_df["listing_id"].isin(liked_ids)
+def _candidate_positions(similarity, queries):
+    """查询房源 -> 去重、升序的有效行号"""
+    candidates = _listing_positions(similarity, [str(q) for q in queries])
+    return np.unique(candidates[candidates >= 0])
 
-    # 是否排除已看过
+
+def _rank(similarity, scores, seen_positions, top_k, include_seen=False, candidates=None):
+    """
+    在打分向量上原地屏蔽已看过房源，用 argpartition 取 Top-K，只为这 K 个结果构造 dict。
+    candidates 不为空时 scores 与其对齐（只对候选房源打过分）。
+    """
     if not include_seen:
-        rec_df = rec_df[~rec_df["seen"]]
+        if candidates is None:
+            scores[seen_positions] = -np.inf
+        else:
+            scores[np.isin(candidates, seen_positions)] = -np.inf
+    top = top_k_positions(scores, top_k)
+    top = top[np.isfinite(scores[top])]
+    result_positions = top if candidates is None else candidates[top]
+
+    seen = set(seen_positions.tolist())
+    ids = similarity.ids
+    return [
+        {"listing_id": ids[p], "recommend_score": float(s), "seen": p in seen}
+        for p, s in zip(result_positions.tolist(), scores[top].tolist())
+    ]
+
+
+def _parse_location(location):
+    """{"lat", "lon", "radius_km"} -> (lat, lon, radius_km)；缺失或非数值时抛出 BadRequest"""
+    if not isinstance(location, dict):
+        raise BadRequest("'location' must be an object with 'lat', 'lon' and 'radius_km'")
+    try:
+        lat, lon, radius_km = (float(location[key]) for key in ("lat", "lon", "radius_km"))
+    except (KeyError, TypeError, ValueError):
+        raise BadRequest("'location' must contain numeric 'lat', 'lon' and 'radius_km'")
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0 and radius_km >= 0):
+        raise BadRequest("'location' is out of range")
+    return lat, lon, radius_km
 
-    # 排序与Top-K
-    rec_df = rec_df.sort_values("recommend_score", ascending=False)
 
-    # 如果queries不为空(就是查询这些房源的偏好顺序, 而不是全局的)
-    # 把queries的内容按照rec_df进行排序, 并返回
-    if queries:
-        queries = [str(q) for q in queries]
-        rec_df = rec_df[rec_df["listing_id"].isin(queries)]
+def _parse_interactions(inter_list):
+    """
+    校验交互列表并去重（同一 listing_id 取最后一条），
+    返回 (listing_ids, likes, views)，like/views 非数值按 0 处理。
+    """
+    merged = {}
+    for item in inter_list:
+        if not isinstance(item, dict) or not {"listing_id", "like", "views"}.issubset(item):
+            raise BadRequest("Each interaction must contain {'listing_id', 'like', 'views'}")
+        merged.pop(str(item["listing_id"]), None)
+        merged[str(item["listing_id"])] = (_to_int(item["like"]), _to_int(item["views"]))
+    listing_ids = list(merged)
+    likes = np.fromiter((v[0] for v in merged.values()), dtype=np.float64, count=len(merged))
+    views = np.fromiter((v[1] for v in merged.values()), dtype=np.float64, count=len(merged))
+    return listing_ids, likes, views
+
+
+def _to_int(v):
+    try:
+        return int(float(v))
+    except (TypeError, ValueError):
+        return 0
 
-    rec_df = rec_df.head(int(top_k))
 
-    return {
-        "user_id": user_id,
-        "count": len(rec_df),
-        "recommendations": rec_df.to_dict(orient="records"),
-        "invalid_ids": invalid_ids,
-        "message": "Recommendation generated successfully."
-    }
+def recommend_batch(users, top_k=10, alpha=2.0, include_seen=False, chunk_size=None):
+    """
+    批量推荐：一次为多个用户打分。
+    users: [{"user_id": ..., "interactions": [{"listing_id", "like", "views"}, ...]}, ...]
+    每 chunk_size 个用户构造一个 (用户 × 房源) 稀疏权重矩阵（α * like + views），
+    与相似度矩阵做一次稀疏 × 稠密乘法，再逐用户取 Top-K。返回顺序与输入一致。
+    """
+    chunk_size = max(1, int(chunk_size or config.BATCH_CHUNK_SIZE))
+    similarity = models.active.similarity
+    n = len(similarity)
+    results = []
+    for start in range(0, len(users), chunk_size):
+        chunk = users[start:start + chunk_size]
+
+        parsed = []
+        for user in chunk:
+            listing_ids, likes, views = _parse_interactions(user.get("interactions") or [])
+            positions = _listing_positions(similarity, listing_ids)
+            valid = positions >= 0
+            invalid_ids = [lid for lid, ok in zip(listing_ids, valid) if not ok]
+            parsed.append((user.get("user_id"), positions[valid], (alpha * likes + views)[valid], invalid_ids))
+
+        indptr = np.cumsum([0] + [len(p[1]) for p in parsed])
+        indices = np.concatenate([p[1] for p in parsed]) if parsed else np.empty(0, dtype=np.int64)
+        data = np.concatenate([p[2] for p in parsed]) if parsed else np.empty(0)
+        weights = sp.csr_matrix((data, indices, indptr), shape=(len(parsed), n))
+        scores = similarity.batch_scores(weights)
+
+        for row, (user_id, seen_positions, user_weights, invalid_ids) in enumerate(parsed):
+            if len(seen_positions) == 0:
+                results.append({
+                    "user_id": user_id,
+                    "count": 0,
+                    "recommendations": [],
+                    "invalid_ids": invalid_ids,
+                    "message": "All listing_id are invalid — cannot generate recommendation."
+                    if invalid_ids else "No interactions found for this user."
+                })
+                continue
+            user_scores = np.array(scores[row], dtype=np.float64)
+            total = user_weights.sum()
+            if total > 0:
+                user_scores /= total
+            recs = _rank(similarity, user_scores, seen_positions, top_k, include_seen=include_seen)
+            results.append({
+                "user_id": user_id,
+                "count": len(recs),
+                "recommendations": recs,
+                "invalid_ids": invalid_ids,
+                "message": "Recommendation generated successfully."
+            })
+    return results
 
 # -----------------------------
 # 4) GET /recommend
@@ -175,12 +370,12 @@ def recommend_post():
         71602,
         71423
       ], # 可选, 当存在时则查询这些房源的偏好顺序, 不存在则全局
+      "location": {"lat": 1.3521, "lon": 103.8198, "radius_km": 2.0},  # 可选, 只在半径内的房源中推荐
       "top_k": 5,            # 可选（默认10）
       "alpha": 2.0,          # 可选（默认2.0）
       "include_seen": false  # 可选（默认false）
     }
     """
-    global interactions
     app.logger.info('Test API received')
     try:
         data = request.get_json(force=True, silent=False)
@@ -191,28 +386,16 @@ def recommend_post():
         inter_list = data.get("interactions")
         # 如果不存在则返回空列表, recommend_for_user查全局
         listing_id_queries = data.get("listing_id_queries", [])
+        location = _parse_location(data["location"]) if data.get("location") is not None else None
         if not user_id or not isinstance(inter_list, list) or len(inter_list) == 0:
             raise BadRequest("Body must contain 'user_id' and non-empty 'interactions' list")
 
-        # 校验并转 DataFrame
-        df = pd.DataFrame(inter_list)
-        required_cols = {"listing_id", "like", "views"}
-        if df.empty or not required_cols.issubset(df.columns):
-            raise BadRequest(f"Each interaction must contain {required_cols}")
-
-        # 去重（同一 listing_id 取最后一条）
-        df = df.drop_duplicates(subset=["listing_id"], keep="last").copy()
-
-        # 组装统一格式（全部转为字符串/整数）
-        df["user_id"] = str(user_id)
-        df["listing_id"] = df["listing_id"].astype(str)
-        df["like"] = pd.to_numeric(df["like"], errors="coerce").fillna(0).astype(int)
-        df["views"] = pd.to_numeric(df["views"], errors="coerce").fillna(0).astype(int)
-        df = df[["user_id", "listing_id", "like", "views"]]
-
-        # —— replace：先删该 user_id 旧交互，再写新交互
-        interactions = interactions[interactions["user_id"] != user_id].copy()
-        interactions = pd.concat([interactions, df], ignore_index=True)
+        # 校验、去重（同一 listing_id 取最后一条），并用本次交互覆盖该 user_id 的旧交互
+        listing_ids, likes, views = _parse_interactions(inter_list)
+        previous = interactions.get(user_id)
+        record = interactions.replace(user_id, listing_ids, likes, views)
+        if previous is not None and previous.fingerprint != record.fingerprint:
+            result_cache.invalidate_user(str(user_id))
 
         # 读取可选参数
         top_k = int(data.get("top_k", 10))
@@ -220,7 +403,8 @@ def recommend_post():
         include_seen = bool(data.get("include_seen", False))
 
         # 计算推荐
-        result = recommend_for_user(user_id=user_id, top_k=top_k, alpha=alpha, include_seen=include_seen, queries=listing_id_queries)
+        result = recommend_for_user(user_id=user_id, top_k=top_k, alpha=alpha, include_seen=include_seen,
+                                    queries=listing_id_queries, location=location)
         return jsonify(result)
     except BadRequest as e:
         return jsonify({"error": str(e)}), 400
@@ -228,7 +412,46 @@ def recommend_post():
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 # -----------------------------
-# 6) GET /recommend_map
+# 6) POST /recommend_batch
+# -----------------------------
+@app.post("/recommend_batch")
+def recommend_batch_post():
+    """
+    批量推荐（例如夜间为所有活跃用户刷新推荐）。
+
+    请求体示例：
+    {
+      "users": [
+        {"user_id": "U001", "interactions": [{"listing_id": "71609", "like": 1, "views": 3}]},
+        {"user_id": "U002", "interactions": [{"listing_id": "71896", "like": 0, "views": 2}]}
+      ],
+      "top_k": 10,           # 可选（默认10）
+      "alpha": 2.0,          # 可选（默认2.0）
+      "include_seen": false  # 可选（默认false）
+    }
+    """
+    try:
+        data = request.get_json(force=True, silent=False)
+        if not isinstance(data, dict):
+            raise BadRequest("Invalid JSON body")
+
+        users = data.get("users")
+        if not isinstance(users, list) or not all(isinstance(u, dict) and u.get("user_id") for u in users):
+            raise BadRequest("Body must contain a 'users' list of objects with 'user_id' and 'interactions'")
+
+        top_k = int(data.get("top_k", 10))
+        alpha = float(data.get("alpha", 2.0))
+        include_seen = bool(data.get("include_seen", False))
+
+        results = recommend_batch(users, top_k=top_k, alpha=alpha, include_seen=include_seen)
+        return jsonify({"count": len(results), "results": results})
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+# -----------------------------
+# 7) GET /recommend_map
 # -----------------------------
 @app.get("/recommend_map")
 def recommend_map():
@@ -255,42 +478,14 @@ def recommend_map():
         if not rec or rec.get("count", 0) == 0:
             return jsonify({"user_id": user_id, "count": 0, "missing": [], "recommendations": []})
 
-        recs = rec["recommendations"]
-        rec_ids = [str(r["listing_id"]) for r in recs]
-
-        # 匹配 listings
-        listings_local = listings.copy()
-        listings_local["id"] = listings_local["id"].astype(str)
-        matched = listings_local[listings_local["id"].isin(rec_ids)]
-
-        merged = matched.merge(pd.DataFrame(recs), left_on="id", right_on="listing_id", how="left")
-        merged = merged.rename(columns={
-            "neighbourhood_cleansed": "neighbourhood",
-            "neighbourhood_group_cleansed": "region"
-        })
-
-        numeric_cols = ["latitude", "longitude", "price", "review_scores_rating"]
-        for col in numeric_cols:
-            merged[col] = pd.to_numeric(merged[col], errors="coerce")
-
-        # 去除空坐标 & 数值清洗
-        merged = merged.replace([np.inf, -np.inf], np.nan)
-        merged = merged.dropna(subset=["latitude", "longitude"])
-        merged[numeric_cols] = merged[numeric_cols].apply(lambda x: np.nan_to_num(x, nan=0.0, posinf=0.0, neginf=0.0))
-
-        results = merged[[
-            "listing_id", "name", "latitude", "longitude", "price",
-            "review_scores_rating", "neighbourhood", "region", "property_type",
-            "recommend_score", "seen"
-        ]].copy()
-
-        missing = list(set(rec_ids) - set(results["listing_id"].astype(str)))
+        # 按行号从预处理好的房源表中收集 K 行
+        results, missing = models.active.listings.gather(rec["recommendations"])
 
         payload = {
             "user_id": user_id,
-            "count": int(len(results)),
+            "count": len(results),
             "missing": missing,
-            "recommendations": results.to_dict(orient="records")
+            "recommendations": results
         }
         return jsonify(payload)
     except BadRequest as e:
@@ -299,10 +494,56 @@ def recommend_map():
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 # -----------------------------
-# 7) main
+# 8) POST /interactions/snapshot
+# -----------------------------
+@app.post("/interactions/snapshot")
+def interactions_snapshot():
+    """
+    把本进程上次写入之后改动过的用户写成增量快照（INTERACTIONS_SNAPSHOT.part-*.npz），
+    下次启动（或 serve.py 退出）时合并进主快照。多 worker 时只包含处理本请求的 worker 的改动
+    """
+    try:
+        if not config.INTERACTIONS_SNAPSHOT:
+            raise BadRequest("INTERACTIONS_SNAPSHOT is not configured")
+        path, users = interactions.save_changes(config.INTERACTIONS_SNAPSHOT)
+        return jsonify({"path": path, "users": users})
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+# -----------------------------
+# 9) GET /cache/stats
+# -----------------------------
+@app.get("/cache/stats")
+def cache_stats():
+    """推荐结果缓存的命中/未命中计数"""
+    return jsonify(result_cache.stats())
+
+# -----------------------------
+# 10) 模型热加载
+# -----------------------------
+@app.post("/admin/reload")
+def admin_reload():
+    """
+    后台重新加载相似度矩阵与房源表，校验通过后原子切换；进行中的请求继续使用旧版本。
+    已有重新加载在进行时返回 409。
+    多进程部署（serve.py）时该请求只会到达一个 worker，请配合 MODEL_RELOAD_POLL 使用。
+    """
+    started = models.reload_async()
+    return jsonify({"started": started, **models.status()}), 202 if started else 409
+
+
+@app.get("/admin/model")
+def admin_model():
+    """当前生效的模型版本、加载耗时与最近一次重新加载的结果"""
+    return jsonify(models.status())
+
+# -----------------------------
+# 11) main
 # -----------------------------
 
 
 if __name__ == "__main__":
-    # 与原来一致的端口
-    app.run(host="0.0.0.0", port=7860, debug=True)
\ No newline at end of file
+    # 开发模式（单进程）；生产环境使用 serve.py 多进程
+    app.run(host="0.0.0.0", port=config.PORT, debug=True)
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+推荐结果缓存
+
+进程内 LRU 缓存，限制条目数与存活时间（TTL）。
+键由调用方构造，通常包含用户交互指纹、alpha、include_seen、top_k 与查询集合指纹，
+交互内容变化后旧键自然不再命中；invalidate_user() 用于在交互被替换时主动释放该用户的条目。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def fingerprint(*parts):
+    """对若干字符串/字节序列计算短哈希"""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, maxsize=4096, ttl=300.0):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self._entries = OrderedDict()   # key -> (过期时间, user_id, value)
+        self._by_user = {}              # user_id -> set(key)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user_id, value = entry
+            if expires_at < time.monotonic():
+                self._drop(key, user_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, user_id, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key, self._entries[key][1])
+            self._entries[key] = (time.monotonic() + self.ttl, user_id, value)
+            self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old_key, (_, old_user, _) = next(iter(self._entries.items()))
+                self._drop(old_key, old_user)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        """删除该用户的所有缓存条目"""
+        with self._lock:
+            keys = self._by_user.pop(user_id, ())
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, key, user_id):
+        self._entries.pop(key, None)
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,85 @@
+"""
+生产模式：gunicorn 多进程服务
+
+  RECOMMEND_WORKERS=8 RECOMMEND_THREADS=4 python serve.py
+
+master 进程在 fork 之前完成所有加载（preload_app）：
+  - 若只有 cosine_similarity.csv，先一次性转换为二进制 memmap 格式；
+    相似度矩阵以只读 memmap 打开，所有 worker 共享同一份页缓存
+  - 房源表等元数据在 fork 前载入并 gc.freeze()，worker 以写时复制方式共享
+每个 worker 只持有自己的请求状态、结果缓存与用户交互存储。
+注意：交互存储按进程独立，GET /recommend 只能看到本进程收到的 POST；
+后端调用的 POST /recommend 每次都携带完整交互，不受影响。
+交互快照：worker 退出时只写自己改动过的用户（增量快照），master 不写；
+所有 worker 退出后 master 在 on_exit 中按用户修改时间把增量合并进 INTERACTIONS_SNAPSHOT。
+热加载：POST /admin/reload 只会到达一个 worker；设置 MODEL_RELOAD_POLL 后
+每个 worker 会各自检测数据文件更新并切换到新快照。
+"""
+import gc
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+import config
+from interaction_store import compact_snapshot
+from similarity_store import convert_csv, is_binary_store
+
+
+class RecommendationServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from recommendation import app
+        # fork 前冻结已加载对象，避免 worker 中的 GC 触碰这些页导致写时复制
+        gc.freeze()
+        return app
+
+
+def post_fork(server, worker):
+    # fork 不会复制线程：在每个 worker 中重新启动数据文件监视线程
+    from recommendation import models
+    models.start_watcher(config.MODEL_RELOAD_POLL)
+
+
+def on_exit(server):
+    # 此时 worker 均已退出并写完增量快照，合并进主快照
+    if config.INTERACTIONS_SNAPSHOT:
+        compact_snapshot(config.INTERACTIONS_SNAPSHOT)
+
+
+def ensure_binary_similarity():
+    """共享内存依赖 memmap：没有二进制格式时从 CSV 转换一次"""
+    if config.SIMILARITY_MODE == "topk" and is_binary_store(config.SIMILARITY_TOPK_PATH):
+        return
+    if config.SIMILARITY_MODE == "ann":
+        return
+    if not is_binary_store(config.SIMILARITY_PATH) and os.path.exists(config.SIMILARITY_CSV):
+        print(f"Converting {config.SIMILARITY_CSV} to {config.SIMILARITY_PATH} for shared memory mapping")
+        convert_csv(config.SIMILARITY_CSV, config.SIMILARITY_PATH)
+
+
+def main():
+    ensure_binary_similarity()
+    options = {
+        "bind": f"0.0.0.0:{config.PORT}",
+        "workers": config.WORKERS,
+        "threads": config.THREADS,
+        "worker_class": "gthread",
+        "preload_app": True,
+        "post_fork": post_fork,
+        "on_exit": on_exit,
+        "accesslog": "-",
+    }
+    RecommendationServer(options).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,428 @@
+"""
+相似度矩阵存储
+
+二进制格式（一个目录）：
+  - matrix.npy        N×N 相似度矩阵（float32 / float16 / int8），以 np.memmap 只读打开
+  - scales.npy        仅 int8：每行的缩放系数，S[i, j] ≈ matrix[i, j] * scales[i]
+  - listing_ids.txt   行/列对应的 listing_id，每行一个
+  - meta.json         格式、dtype、形状等元信息
+
+多个 worker 进程打开同一份 matrix.npy 时共享操作系统页缓存，
+冷启动只需读取 ids 与 meta，无需解析 CSV。
+
+稀疏 Top-K 格式（format=topk）只保留每个房源最相似的 K 个邻居，以 CSR 三个数组存储：
+  - indptr.npy / indices.npy / data.npy，同样以 memmap 打开
+
+一次性转换：
+  python similarity_store.py convert ./data/cosine_similarity.csv ./data/similarity --dtype float32
+  python similarity_store.py topk ./data/similarity ./data/similarity_topk --k 200
+  python similarity_store.py quantize ./data/similarity ./data/similarity_int8 --dtype int8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+MATRIX_FILE = "matrix.npy"
+INDPTR_FILE = "indptr.npy"
+INDICES_FILE = "indices.npy"
+DATA_FILE = "data.npy"
+SCALES_FILE = "scales.npy"
+IDS_FILE = "listing_ids.txt"
+META_FILE = "meta.json"
+
+# 余弦相似度在 [-1, 1] 内：float16 为 float64 的 1/4，int8（每行一个缩放系数）为 1/8
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+INT8_MAX = 127
+
+# 受限打分时，候选列数超过 N / RESTRICTED_GATHER_RATIO 就改为读取整行后再取列
+RESTRICTED_GATHER_RATIO = 8
+
+
+# -----------------------------
+# 1) 稠密相似度矩阵
+# -----------------------------
+class DenseSimilarity:
+    """
+    稠密 N×N 相似度矩阵（内存数组或 memmap）。
+    ids: 行/列对应的 listing_id（字符串）
+    positions: listing_id -> 行号
+    scales: int8 量化矩阵的每行缩放系数（浮点矩阵为 None）
+    """
+    kind = "dense"
+
+    def __init__(self, ids, matrix, source=None, scales=None):
+        if matrix.shape != (len(ids), len(ids)):
+            raise ValueError(f"Matrix shape {matrix.shape} does not match {len(ids)} listing ids")
+        if scales is not None and len(scales) != len(ids):
+            raise ValueError(f"Got {len(scales)} row scales for {len(ids)} listing ids")
+        self.ids = [str(i) for i in ids]
+        self.positions = {lid: i for i, lid in enumerate(self.ids)}
+        self.matrix = matrix
+        self.scales = scales
+        self.source = source
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dtype(self):
+        return str(self.matrix.dtype)
+
+    @property
+    def nbytes(self):
+        return int(self.matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def rows(self, positions):
+        """按行号（或切片）取相似度行（memmap 只会读入这些行）；int8 返回反量化后的 float32"""
+        rows = np.asarray(self.matrix[positions])
+        if self.scales is None:
+            return rows
+        return rows.astype(np.float32) * np.asarray(self.scales[positions], dtype=np.float32)[..., None]
+
+    def _row_weights(self, positions, weights):
+        """int8 反量化放在打分核内：把行缩放系数并入权重，不生成反量化后的行"""
+        if self.scales is None:
+            return weights
+        return np.asarray(weights, dtype=np.float64) * self.scales[positions]
+
+    def weighted_scores(self, positions, weights, columns=None):
+        """
+        加权相似度之和：weights · S[positions]，返回长度为 N 的向量。
+        columns 不为空时只收集这些列，返回与 columns 对齐的分数（工作量与候选数成正比）。
+        """
+        weights = self._row_weights(positions, weights)
+        if columns is None:
+            return np.dot(weights, np.asarray(self.matrix[positions]))
+        if len(columns) * RESTRICTED_GATHER_RATIO > len(self.ids):
+            # 候选较多时整行连续读取更快
+            return np.dot(weights, np.asarray(self.matrix[positions]))[columns]
+        return np.dot(weights, np.asarray(self.matrix[np.ix_(positions, columns)]))
+
+    def batch_scores(self, weights):
+        """
+        批量打分：weights 为 (用户数 × N) 稀疏 CSR 矩阵，返回 (用户数 × N) 稠密分数。
+        只读取该批用户实际交互过的行，稀疏 × 稠密一次乘完。
+        """
+        rows = np.unique(weights.indices)
+        weights = weights[:, rows]
+        if self.scales is not None:
+            weights = weights @ sp.diags(np.asarray(self.scales[rows], dtype=np.float64))
+        return np.asarray(weights @ np.asarray(self.matrix[rows]).astype(np.float32, copy=False))
+
+
+# -----------------------------
+# 2) 稀疏 Top-K 近邻索引
+# -----------------------------
+class TopKSimilarity:
+    """
+    每行只保留 Top-K 邻居的 CSR 矩阵。
+    第 i 行的邻居为 indices[indptr[i]:indptr[i+1]]，相似度为 data[...]；
+    未保留的相似度视为 0。
+    """
+    kind = "topk"
+
+    def __init__(self, ids, indptr, indices, data, k, source=None):
+        if len(indptr) != len(ids) + 1 or len(indices) != len(data):
+            raise ValueError("Inconsistent CSR arrays for top-K similarity index")
+        self.ids = [str(i) for i in ids]
+        self.positions = {lid: i for i, lid in enumerate(self.ids)}
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.k = int(k)
+        self.source = source
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return int(self.indptr.nbytes + self.indices.nbytes + self.data.nbytes)
+
+    def weighted_scores(self, positions, weights, columns=None):
+        """
+        稀疏行收集 + 累加：只触碰各行的 K 个邻居。
+        columns（升序行号）不为空时只保留落在这些列上的邻居，返回与 columns 对齐的分数。
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self.indptr[positions]
+        counts = self.indptr[positions + 1] - starts
+        gather = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        row_weights = np.repeat(np.asarray(weights, dtype=np.float64), counts)
+        neighbours = self.indices[gather]
+        contrib = row_weights * self.data[gather]
+        if columns is None:
+            return np.bincount(neighbours, weights=contrib, minlength=len(self.ids)).astype(np.float64, copy=False)
+        slots = np.minimum(np.searchsorted(columns, neighbours), max(len(columns) - 1, 0))
+        hit = columns[slots] == neighbours if len(columns) else np.zeros(len(neighbours), dtype=bool)
+        return np.bincount(slots[hit], weights=contrib[hit], minlength=len(columns)).astype(np.float64, copy=False)
+
+    def batch_scores(self, weights):
+        """批量打分：稀疏 × 稀疏，再展开为 (用户数 × N) 稠密分数"""
+        n = len(self.ids)
+        csr = sp.csr_matrix((self.data, self.indices, self.indptr), shape=(n, n))
+        return (weights @ csr).toarray()
+
+
+def top_k_positions(scores, k):
+    """取分数最高的 k 个位置（argpartition + 仅对 k 个结果排序）"""
+    n = len(scores)
+    k = min(int(k), n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        part = np.argpartition(scores, n - k)[n - k:]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(scores[part], kind="stable")[::-1]]
+
+
+def build_topk(dense, k, block_rows=1024):
+    """从稠密矩阵按行块提取每行 Top-K 邻居，返回 TopKSimilarity"""
+    n = len(dense)
+    k = min(int(k), n)
+    indices = np.empty(n * k, dtype=np.int32)
+    data = np.empty(n * k, dtype=np.float32)
+    for start in range(0, n, block_rows):
+        block = dense.rows(slice(start, start + block_rows)).astype(np.float32, copy=False)
+        for offset, row in enumerate(block):
+            top = top_k_positions(row, k)
+            i = (start + offset) * k
+            indices[i:i + k] = top
+            data[i:i + k] = row[top]
+    indptr = np.arange(0, n * k + 1, k, dtype=np.int64)
+    return TopKSimilarity(dense.ids, indptr, indices, data, k, source=dense.source)
+
+
+# -----------------------------
+# 3) 读取
+# -----------------------------
+def load_csv(path):
+    """兼容旧格式：直接解析 cosine_similarity.csv"""
+    df = pd.read_csv(path, index_col=0)
+    ids = df.index.astype(str).tolist()
+    if df.columns.astype(str).tolist() != ids:
+        raise ValueError(f"{path}: row and column listing ids differ")
+    return DenseSimilarity(ids, df.values, source=path)
+
+
+def read_ids(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def read_meta(directory):
+    with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_binary(directory, mmap=True):
+    """打开二进制格式目录；mmap=True 时矩阵以只读 memmap 方式映射"""
+    meta = read_meta(directory)
+    ids = read_ids(os.path.join(directory, IDS_FILE))
+    mmap_mode = "r" if mmap else None
+    if meta.get("format") == "topk":
+        arrays = [np.load(os.path.join(directory, name), mmap_mode=mmap_mode)
+                  for name in (INDPTR_FILE, INDICES_FILE, DATA_FILE)]
+        return TopKSimilarity(ids, *arrays, k=meta["k"], source=directory)
+    matrix = np.load(os.path.join(directory, MATRIX_FILE), mmap_mode=mmap_mode)
+    if str(matrix.dtype) != meta.get("dtype", str(matrix.dtype)):
+        raise ValueError(f"{directory}: matrix dtype {matrix.dtype} does not match meta {meta['dtype']}")
+    scales = np.load(os.path.join(directory, SCALES_FILE)) if matrix.dtype == np.int8 else None
+    return DenseSimilarity(ids, matrix, source=directory, scales=scales)
+
+
+def is_binary_store(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+def open_similarity(path, mmap=True):
+    """根据路径自动选择格式：二进制目录或 CSV 文件"""
+    if is_binary_store(path):
+        return load_binary(path, mmap=mmap)
+    return load_csv(path)
+
+
+# -----------------------------
+# 4) 写入 / 转换
+# -----------------------------
+def write_ids(path, ids):
+    with open(path, "w", encoding="utf-8") as f:
+        for lid in ids:
+            f.write(f"{lid}\n")
+
+
+def write_meta(directory, meta):
+    tmp = os.path.join(directory, META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, os.path.join(directory, META_FILE))
+
+
+def quantize(block, dtype):
+    """
+    把一块浮点行转换为存储 dtype，返回 (values, scales)。
+    int8 按行对称量化：scale = max|row| / 127，values = round(row / scale)；浮点 dtype 的 scales 为 None。
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported dtype {dtype}, expected one of {SUPPORTED_DTYPES}")
+    if dtype != "int8":
+        return block.astype(dtype), None
+    block = np.asarray(block, dtype=np.float64)
+    scales = np.abs(block).max(axis=1, initial=0.0) / INT8_MAX
+    scales[scales == 0] = 1.0
+    values = np.clip(np.rint(block / scales[:, None]), -INT8_MAX, INT8_MAX).astype(np.int8)
+    return values, scales.astype(np.float32)
+
+
+def write_dense(out_dir, ids, blocks, dtype="float32", source=None):
+    """
+    把按顺序产生的行块 (start, 浮点行块) 写成稠密二进制目录。
+    matrix.npy 先写临时文件，meta.json 最后写入，因此目录只有在写入完整后才会被识别为有效存储。
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported dtype {dtype}, expected one of {SUPPORTED_DTYPES}")
+    os.makedirs(out_dir, exist_ok=True)
+    n = len(ids)
+
+    matrix_tmp = os.path.join(out_dir, MATRIX_FILE + ".tmp")
+    matrix = np.lib.format.open_memmap(matrix_tmp, mode="w+", dtype=dtype, shape=(n, n))
+    scales = np.ones(n, dtype=np.float32) if dtype == "int8" else None
+    row = 0
+    for start, block in blocks:
+        if start != row:
+            raise ValueError(f"Expected rows starting at {row}, got {start}")
+        values, block_scales = quantize(block, dtype)
+        matrix[row:row + len(values)] = values
+        if scales is not None:
+            scales[row:row + len(values)] = block_scales
+        row += len(values)
+    if row != n:
+        raise ValueError(f"Expected {n} rows, wrote {row}")
+    matrix.flush()
+    del matrix
+
+    os.replace(matrix_tmp, os.path.join(out_dir, MATRIX_FILE))
+    if scales is not None:
+        scales_tmp = os.path.join(out_dir, SCALES_FILE + ".tmp")
+        with open(scales_tmp, "wb") as f:
+            np.save(f, scales)
+        os.replace(scales_tmp, os.path.join(out_dir, SCALES_FILE))
+    ids_tmp = os.path.join(out_dir, IDS_FILE + ".tmp")
+    write_ids(ids_tmp, ids)
+    os.replace(ids_tmp, os.path.join(out_dir, IDS_FILE))
+    write_meta(out_dir, {
+        "format": "dense",
+        "dtype": dtype,
+        "shape": [n, n],
+        "source": os.path.abspath(source) if source else None,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    return n
+
+
+def convert_csv(csv_path, out_dir, dtype="float32", chunksize=1024):
+    """
+    流式把 cosine_similarity.csv 转换为二进制格式。
+    按 chunksize 行分块解析并写入 memmap，内存占用与 N 成线性关系。
+    """
+    ids = pd.read_csv(csv_path, index_col=0, nrows=0).columns.astype(str).tolist()
+
+    def blocks():
+        row = 0
+        for chunk in pd.read_csv(csv_path, index_col=0, chunksize=chunksize):
+            chunk_ids = chunk.index.astype(str).tolist()
+            if chunk_ids != ids[row:row + len(chunk_ids)]:
+                raise ValueError(f"{csv_path}: row order does not match column order near row {row}")
+            yield row, chunk.values
+            row += len(chunk)
+
+    return write_dense(out_dir, ids, blocks(), dtype=dtype, source=csv_path)
+
+
+def convert_dense(dense, out_dir, dtype, block_rows=1024):
+    """把已有稠密存储按行块重新量化为另一种 dtype（如 float32 -> int8）"""
+    n = len(dense)
+    blocks = ((start, dense.rows(slice(start, start + block_rows))) for start in range(0, n, block_rows))
+    return write_dense(out_dir, dense.ids, blocks, dtype=dtype, source=dense.source)
+
+
+def save_topk(topk, out_dir):
+    """把 TopKSimilarity 写成二进制目录（meta.json 最后写入）"""
+    os.makedirs(out_dir, exist_ok=True)
+    for name, array in ((INDPTR_FILE, topk.indptr), (INDICES_FILE, topk.indices), (DATA_FILE, topk.data)):
+        tmp = os.path.join(out_dir, name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(array))
+        os.replace(tmp, os.path.join(out_dir, name))
+    ids_tmp = os.path.join(out_dir, IDS_FILE + ".tmp")
+    write_ids(ids_tmp, topk.ids)
+    os.replace(ids_tmp, os.path.join(out_dir, IDS_FILE))
+    write_meta(out_dir, {
+        "format": "topk",
+        "dtype": str(topk.data.dtype),
+        "k": topk.k,
+        "shape": [len(topk), len(topk)],
+        "nnz": int(len(topk.data)),
+        "source": os.path.abspath(topk.source) if topk.source else None,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+
+
+# -----------------------------
+# 5) 命令行
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Similarity matrix storage tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_convert = sub.add_parser("convert", help="Convert cosine_similarity.csv to the binary memmap format")
+    p_convert.add_argument("csv", help="Path to cosine_similarity.csv")
+    p_convert.add_argument("out_dir", help="Output directory, e.g. ./data/similarity")
+    p_convert.add_argument("--dtype", default="float32", choices=SUPPORTED_DTYPES)
+    p_convert.add_argument("--chunksize", type=int, default=1024, help="CSV rows parsed per chunk")
+
+    p_topk = sub.add_parser("topk", help="Build a sparse top-K neighbour index from a dense matrix")
+    p_topk.add_argument("source", help="Dense source: cosine_similarity.csv or a binary directory")
+    p_topk.add_argument("out_dir", help="Output directory, e.g. ./data/similarity_topk")
+    p_topk.add_argument("--k", type=int, default=200, help="Neighbours kept per listing")
+
+    p_quantize = sub.add_parser("quantize", help="Re-encode a dense matrix with a smaller dtype")
+    p_quantize.add_argument("source", help="Dense source: cosine_similarity.csv or a binary directory")
+    p_quantize.add_argument("out_dir", help="Output directory, e.g. ./data/similarity_int8")
+    p_quantize.add_argument("--dtype", default="int8", choices=SUPPORTED_DTYPES)
+
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    if args.command == "convert":
+        n = convert_csv(args.csv, args.out_dir, dtype=args.dtype, chunksize=args.chunksize)
+        print(f"Converted {n}x{n} matrix to {args.out_dir} ({args.dtype}) in {time.perf_counter() - start:.1f}s")
+    elif args.command == "quantize":
+        dense = open_similarity(args.source)
+        if dense.kind != "dense":
+            parser.error(f"{args.source} is not a dense similarity matrix")
+        n = convert_dense(dense, args.out_dir, args.dtype)
+        quantized = load_binary(args.out_dir)
+        print(f"Wrote {n}x{n} {args.dtype} matrix to {args.out_dir} "
+              f"({quantized.nbytes / 2**20:.1f} MiB vs {dense.nbytes / 2**20:.1f} MiB {dense.dtype}) "
+              f"in {time.perf_counter() - start:.1f}s")
+    elif args.command == "topk":
+        dense = open_similarity(args.source)
+        if dense.kind != "dense":
+            parser.error(f"{args.source} is not a dense similarity matrix")
+        topk = build_topk(dense, args.k)
+        save_topk(topk, args.out_dir)
+        print(f"Built top-{topk.k} index for {len(topk)} listings "
+              f"({topk.nbytes / 2**20:.1f} MiB vs {dense.nbytes / 2**20:.1f} MiB dense) "
+              f"in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
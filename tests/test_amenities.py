@@ -0,0 +1,43 @@
+"""
+两个服务各自打包（docker-compose 中 build context 分别是各自的目录），amenities.py 只能各存一份。
+这里校验两份的 CANONICAL 表和规范化结果一致，保证 /properties?amenities= 筛选与推荐特征使用同一套设施编码。
+"""
+import importlib.util
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLES = [
+    '["Fast wifi \u2013 250 Mbps", "AC - split type ductless system", "Dishwasher", "Washer"]',
+    '["Hair dryer", "Pool table", "Shared outdoor pool", "Free parking on premises", "Lift"]',
+    '["Nespresso machine", "Dedicated workspace", "Keypad", "Smoke detector", "Carbon monoxide alarm"]',
+    '["Samsung refrigerator", "Induction stove", "Body soap", "Shampoo: Dove", "  "]',
+    "wifi, aircon, gym",
+    "",
+]
+
+
+def _load(service):
+    path = os.path.join(ROOT, service, "amenities.py")
+    spec = importlib.util.spec_from_file_location(f"{service.replace('-', '_')}_amenities", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def modules():
+    return _load("backend-service"), _load("recommendation-service")
+
+
+def test_canonical_tables_identical(modules):
+    backend, recommendation = modules
+    assert backend.CANONICAL == recommendation.CANONICAL
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_parse_identical(modules, text):
+    backend, recommendation = modules
+    assert backend.parse(text) == recommendation.parse(text)